@@ -0,0 +1,87 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from tastybites_api.query_budget import unbudgeted
+
+CustomUser = get_user_model()
+
+# Claims CustomTokenObtainPairSerializer.get_token puts into every token
+TOKEN_USER_CLAIMS = ('email', 'is_staff')
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that builds ``request.user`` from the token claims.
+
+    The user is a ``CustomUser`` with only id, email, is_staff and is_active
+    loaded and every other field deferred, so filtering and FK assignment
+    work without a query. is_staff and is_active are not trusted from the
+    token: they come from the row cached by ``get_full_user`` (dropped when
+    the user is saved, at most USER_CACHE_TTL old), so a deactivated or
+    demoted user loses access without waiting for the token to expire.
+
+    This is not fully stateless: each process still reads the user row once
+    per user and USER_CACHE_TTL, and on every request in which that cache
+    misses. Revocation taking effect before the token expires was judged
+    worth that one query.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        claims = {api_settings.USER_ID_FIELD: user_id}
+        claims.update((claim, validated_token[claim]) for claim in TOKEN_USER_CLAIMS if claim in validated_token)
+        db = router.db_for_read(CustomUser)
+        # One query per user and USER_CACHE_TTL, not per request
+        with unbudgeted():
+            row = get_full_user(CustomUser.from_db(db, [CustomUser._meta.pk.attname], [user_id]))
+        if api_settings.CHECK_USER_IS_ACTIVE and not row.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        claims.update(is_staff=row.is_staff, is_active=row.is_active)
+        # from_db expects values in field order; everything else is deferred
+        fields = [f for f in CustomUser._meta.concrete_fields if f.name in claims]
+        field_names = [f.attname for f in fields]
+        values = [f.to_python(claims[f.name]) for f in fields]
+        return CustomUser.from_db(db, field_names, values)
+
+
+_user_cache = {}  # pk -> (expires_at, user)
+_user_cache_lock = threading.Lock()
+
+
+def get_full_user(user):
+    """Returns the complete row for ``user``, cached in-process for USER_CACHE_TTL"""
+    if not user.get_deferred_fields():
+        return user
+
+    now = time.monotonic()
+    with _user_cache_lock:
+        cached = _user_cache.get(user.pk)
+    if cached is not None and cached[0] > now:
+        return copy.copy(cached[1])
+
+    try:
+        full_user = CustomUser.objects.get(pk=user.pk)
+    except CustomUser.DoesNotExist:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    with _user_cache_lock:
+        if len(_user_cache) >= getattr(settings, 'USER_CACHE_SIZE', 1024):
+            _user_cache.clear()
+        _user_cache[user.pk] = (now + getattr(settings, 'USER_CACHE_TTL', 60), full_user)
+    return copy.copy(full_user)
+
+
+def invalidate_user(pk):
+    with _user_cache_lock:
+        _user_cache.pop(pk, None)
@@ -14,6 +14,7 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
     def get_token(cls, user):
         token = super().get_token(user)
         token['email'] = user.email
+        token['is_staff'] = user.is_staff
         return token
 
 class RegisterSerializer(serializers.ModelSerializer):
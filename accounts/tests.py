@@ -1,3 +1,109 @@
-from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from .authentication import _user_cache
+from .models import CustomUser
+from .serializers import CustomTokenObtainPairSerializer
+
+
+def bearer(user):
+    """Authorization header value for an access token of ``user``"""
+    return f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'
+
+
+class RegisterTests(APITestCase):
+    url = reverse('register')
+
+    def test_register(self):
+        # The email uniqueness check and the INSERT
+        with self.assertNumQueries(2):
+            response = self.client.post(self.url, {'email': 'new@example.com', 'password': 'pw-12345'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('password', response.data)
+        self.assertTrue(CustomUser.objects.get(email='new@example.com').check_password('pw-12345'))
+
+    def test_duplicate_email(self):
+        CustomUser.objects.create_user('taken@example.com', 'pw')
+        response = self.client.post(self.url, {'email': 'taken@example.com', 'password': 'pw'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('email', response.data)
+
+
+class LoginTests(APITestCase):
+    def test_login_claims(self):
+        CustomUser.objects.create_user('cook@example.com', 'pw', is_staff=True)
+        response = self.client.post(
+            reverse('login'), {'email': 'cook@example.com', 'password': 'pw'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'access', 'refresh'})
+
+    def test_wrong_password(self):
+        CustomUser.objects.create_user('cook@example.com', 'pw')
+        response = self.client.post(
+            reverse('login'), {'email': 'cook@example.com', 'password': 'nope'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class UserDetailTests(APITestCase):
+    url = reverse('user_detail')
+
+    def setUp(self):
+        # The user rows are cached per process, across test cases too
+        _user_cache.clear()
+        self.user = CustomUser.objects.create_user('me@example.com', 'pw', first_name='Ada')
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.user))
+
+    def test_user_row_is_cached(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['first_name'], 'Ada')
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_saving_the_user_drops_the_cached_row(self):
+        self.client.get(self.url)
+        self.user.first_name = 'Grace'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['first_name'], 'Grace')
+
+    def test_anonymous(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected_despite_a_valid_token(self):
+        self.client.get(self.url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.data['code'], 'user_inactive')
+
+    def test_deleted_user_is_rejected(self):
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class StaffClaimTests(APITestCase):
+    def setUp(self):
+        _user_cache.clear()
+
+    def test_demoted_user_loses_staff_access_despite_the_token_claim(self):
+        user = CustomUser.objects.create_user('cook@example.com', 'pw', is_staff=True)
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(user))
+        url = reverse('sales_report')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+        user.is_staff = False
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_promotion_is_not_taken_from_a_forged_claim(self):
+        user = CustomUser.objects.create_user('guest@example.com', 'pw')
+        token = CustomTokenObtainPairSerializer.get_token(user).access_token
+        token['is_staff'] = True  # signed, but the row says otherwise
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(self.client.get(reverse('sales_report')).status_code, status.HTTP_403_FORBIDDEN)
@@ -5,20 +5,25 @@ from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import UserSerializer, RegisterSerializer, CustomTokenObtainPairSerializer
 from django.contrib.auth import get_user_model
+from tastybites_api.query_budget import QueryBudgetMixin
+from .authentication import get_full_user
 
 CustomUser = get_user_model()
 
-class RegisterView(generics.CreateAPIView):
+class RegisterView(QueryBudgetMixin, generics.CreateAPIView):
     queryset = CustomUser.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
+    query_budget = 2
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(QueryBudgetMixin, generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 1  # only when the user cache misses
     
     def get_object(self):
-        return self.request.user
+        return get_full_user(self.request.user)
 
-class CustomTokenObtainPairView(TokenObtainPairView):
-    serializer_class = CustomTokenObtainPairSerializer
\ No newline at end of file
+class CustomTokenObtainPairView(QueryBudgetMixin, TokenObtainPairView):
+    serializer_class = CustomTokenObtainPairSerializer
+    query_budget = 1
\ No newline at end of file
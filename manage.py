@@ -6,7 +6,9 @@ import sys
 
 def main():
     """Run administrative tasks."""
-    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tastybites_api.settings')
+    # The test runner checks query budgets and duplicate queries strictly
+    settings = 'tastybites_api.test_settings' if sys.argv[1:2] == ['test'] else 'tastybites_api.settings'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings)
     try:
         from django.core.management import execute_from_command_line
     except ImportError as exc:
@@ -0,0 +1,95 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from tastybites_api.renderers import FastJSONRenderer
+
+from .models import Category
+from .serializers import CategorySerializer
+
+VERSION_KEY = 'menu:version'
+LOCK_TIMEOUT = 10  # seconds a rebuild may hold the lock
+LOCK_WAIT = 2.0  # seconds a follower waits for the leader's snapshot
+LOCK_POLL = 0.05
+
+
+def _timeout():
+    return getattr(settings, 'MENU_CACHE_TIMEOUT', 60 * 60)
+
+
+def get_menu_version():
+    """Returns the current menu version, initialising it if the cache lost it"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # A time based seed never collides with snapshots cached under an
+        # earlier (evicted) version number.
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Invalidates every menu snapshot by moving to a new version"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        return cache.get(VERSION_KEY)
+
+
+def _snapshot_key(version, kind, request, params=None):
+    # Image URLs are absolute, so the snapshot depends on the requested host.
+    base = hashlib.md5(request.build_absolute_uri('/').encode()).hexdigest()[:12]
+    key = f'menu:snapshot:{version}:{kind}:{base}'
+    if params:
+        key += ':' + hashlib.md5(repr(sorted(params.items())).encode()).hexdigest()
+    return key
+
+
+def _build_categories(request):
+    data = CategorySerializer(Category.objects.all(), many=True, context={'request': request}).data
+    return FastJSONRenderer().render(data)
+
+
+def _get_or_build(key, build):
+    """
+    Single-flight cache read: one worker rebuilds a missing snapshot while
+    the others wait for it, falling back to building locally on timeout.
+    """
+    body = cache.get(key)
+    if body is not None:
+        return body
+
+    lock_key = key + ':lock'
+    if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        try:
+            body = build()
+            cache.set(key, body, timeout=_timeout())
+        finally:
+            cache.delete(lock_key)
+        return body
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        body = cache.get(key)
+        if body is not None:
+            return body
+    return build()
+
+
+def get_menu_items_snapshot(request, params, build):
+    """
+    Serialized JSON bytes for a menu item listing. ``params`` are the
+    normalized query parameters identifying it (category, fieldset, page);
+    ``build`` returns its data when the snapshot has to be rebuilt.
+    """
+    key = _snapshot_key(get_menu_version(), 'items', request, params)
+    return _get_or_build(key, lambda: FastJSONRenderer().render(build()))
+
+
+def get_categories_snapshot(request):
+    """Serialized JSON bytes for the category list"""
+    key = _snapshot_key(get_menu_version(), 'categories', request)
+    return _get_or_build(key, lambda: _build_categories(request))
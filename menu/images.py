@@ -0,0 +1,121 @@
+"""
+Resized JPEG and WebP variants of menu item images.
+
+Variants are named after a hash of the source bytes, so they can be served
+with far-future cache headers and are never regenerated for the same file.
+
+Uploads get their variants after the save commits, on a background worker
+(see schedule_variants); the generate_menu_images command catches up on any
+the worker did not get to, e.g. when the process exited first.
+"""
+import hashlib
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections
+from PIL import Image, ImageOps
+
+VARIANTS_DIR = 'menu_images/variants'
+FORMATS = {
+    'jpeg': ('jpg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'format': 'WEBP', 'quality': 80, 'method': 6}),
+}
+
+logger = logging.getLogger(__name__)
+
+# One worker: resizing is CPU bound and serializing it keeps uploads from
+# starving the request threads
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix='menu-images')
+
+
+def get_widths():
+    return getattr(settings, 'MENU_IMAGE_WIDTHS', (320, 640, 1024))
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Writes the variants of the image stored under ``name`` and returns the
+    map kept in ``MenuItem.image_variants``.
+    """
+    with storage.open(name, 'rb') as source:
+        content = source.read()
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem = posixpath.splitext(posixpath.basename(name))[0]
+
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(content)))
+    # Never upscale: widths past the original collapse into the original width
+    widths = sorted({min(width, image.width) for width in get_widths()})
+
+    variants = {'source': name}
+    for key, (extension, options) in FORMATS.items():
+        variants[key] = {}
+        for width in widths:
+            path = f'{VARIANTS_DIR}/{stem}-{digest}-{width}w.{extension}'
+            if not storage.exists(path):
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+                if key == 'jpeg' and resized.mode not in ('RGB', 'L'):
+                    resized = resized.convert('RGB')
+                buffer = io.BytesIO()
+                resized.save(buffer, **options)
+                storage.save(path, ContentFile(buffer.getvalue()))
+            variants[key][str(width)] = path
+    return variants
+
+
+def store_variants(pk, name):
+    """
+    Generates the variants of menu item ``pk``'s image ``name`` and stores
+    them, unless the item's image has been replaced meanwhile.
+    """
+    from .cache import bump_menu_version
+    from .models import MenuItem
+
+    try:
+        variants = generate_variants(name)
+    except OSError:
+        logger.warning('Could not build variants for %s', name, exc_info=True)
+        return
+    # update() skips the signals, the cached menu has to be bumped here
+    if MenuItem.objects.filter(pk=pk, image=name).update(image_variants=variants):
+        bump_menu_version()
+
+
+def _store_variants_in_worker(pk, name):
+    try:
+        store_variants(pk, name)
+    except Exception:
+        logger.exception('Could not store variants for %s', name)
+    finally:
+        connections.close_all()  # the worker thread's own connections
+
+
+def schedule_variants(pk, name):
+    """Queues store_variants on the background worker; returns its future"""
+    return _worker.submit(_store_variants_in_worker, pk, name)
+
+
+def image_srcset(variants, request=None, urls=None):
+    """
+    ``{'jpeg': {'320w': url, ...}, 'webp': {...}}`` for the serializers.
+
+    ``urls`` memoizes storage name -> URL across calls in one response.
+    """
+    if urls is None:
+        urls = {}
+
+    def url(name):
+        if name not in urls:
+            urls[name] = default_storage.url(name)
+            if request is not None:
+                urls[name] = request.build_absolute_uri(urls[name])
+        return urls[name]
+
+    return {
+        key: {f'{width}w': url(path) for width, path in variants[key].items()}
+        for key in FORMATS if key in variants
+    }
@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from menu.transfer import FORMATS, detect_format, export_records, write_records
+
+
+class Command(BaseCommand):
+    help = 'Stream the menu as CSV or JSON Lines in the format import_menu reads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help='Destination file, - writes stdout (default)')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension, csv on stdout')
+
+    def handle(self, *args, **options):
+        path = options['output']
+        try:
+            fmt = options['format'] or ('csv' if path == '-' else detect_format(path))
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        if path == '-':
+            write_records(sys.stdout, fmt, export_records())
+            return
+        with open(path, 'w', newline='', encoding='utf-8') as stream:
+            write_records(stream, fmt, export_records())
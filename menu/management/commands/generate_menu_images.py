@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from menu.cache import bump_menu_version
+from menu.images import generate_variants
+from menu.models import MenuItem
+
+class Command(BaseCommand):
+    help = 'Generate resized JPEG and WebP variants for existing menu item images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild items that already have variants')
+
+    def handle(self, *args, **options):
+        done = skipped = failed = 0
+        for item in MenuItem.objects.exclude(image='').only('id', 'image', 'image_variants').iterator():
+            if not options['force'] and item.image_variants.get('source') == item.image.name:
+                skipped += 1
+                continue
+            try:
+                variants = generate_variants(item.image.name)
+            except OSError as exc:
+                failed += 1
+                self.stderr.write(f'{item.image.name}: {exc}')
+                continue
+            # update() skips the signals, bump the menu version once at the end
+            MenuItem.objects.filter(pk=item.pk).update(image_variants=variants)
+            done += 1
+
+        if done:
+            bump_menu_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated variants for {done} items ({skipped} up to date, {failed} failed)'
+        ))
@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from menu.transfer import FORMATS, MenuImporter, detect_format, read_records
+
+
+class Command(BaseCommand):
+    help = 'Upsert categories and menu items from a CSV or JSON Lines file (or - for stdin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import, - reads stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--images-dir', help='Directory image paths are relative to (default: the file\'s)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=min(8, (os.cpu_count() or 1) * 2),
+                            help='Threads copying images and building their variants')
+        parser.add_argument('--skip-variants', action='store_true',
+                            help='Do not build resized variants while importing images')
+        parser.add_argument('--prune', action='store_true',
+                            help='Delete items missing from the file, except those referenced by orders')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and import, then roll back')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            if not options['format']:
+                raise CommandError('Pass --format when reading stdin')
+            images_dir = options['images_dir'] or os.getcwd()
+        else:
+            images_dir = options['images_dir'] or os.path.dirname(os.path.abspath(path))
+        try:
+            fmt = detect_format(path, options['format'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        importer = MenuImporter(
+            images_dir=images_dir, batch_size=options['batch_size'],
+            workers=options['workers'], variants=not options['skip_variants'],
+        )
+        started = time.perf_counter()
+        try:
+            with (sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')) as stream:
+                importer.run(read_records(stream, fmt), prune=options['prune'], dry_run=options['dry_run'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Import aborted, nothing was changed: {exc}')
+
+        summary = (
+            f'{importer.created} items created, {importer.updated} updated '
+            f'in {time.perf_counter() - started:.1f}s'
+        )
+        if options['prune']:
+            items, categories = importer.deleted
+            summary += f', {items} items and {categories} categories deleted'
+            if importer.kept:
+                summary += f' ({importer.kept} stale items kept, they are referenced by orders)'
+        if importer.image_errors:
+            self.stderr.write(self.style.WARNING(f'{importer.image_errors} images could not be imported'))
+        if options['dry_run']:
+            summary = 'Dry run, rolled back: ' + summary
+        self.stdout.write(self.style.SUCCESS(summary))
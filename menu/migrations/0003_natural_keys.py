@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+def unique_name(name, taken, max_length=100):
+    """``name``, or ``name (2)``, ``name (3)``... when taken, cut to fit max_length"""
+    candidate, number = name, 1
+    while candidate in taken:
+        number += 1
+        suffix = f' ({number})'
+        candidate = name[:max_length - len(suffix)] + suffix
+    taken.add(candidate)
+    return candidate
+
+
+def rename_duplicates(apps, schema_editor):
+    """
+    Renames duplicate category names, and duplicate item names within a
+    category, so the constraints below can be created. The oldest row keeps
+    its name; nothing is deleted since orders point at the items.
+    """
+    Category = apps.get_model('menu', 'Category')
+    MenuItem = apps.get_model('menu', 'MenuItem')
+
+    taken = set()
+    for category in Category.objects.order_by('pk'):
+        name = unique_name(category.name, taken)
+        if name != category.name:
+            Category.objects.filter(pk=category.pk).update(name=name)
+
+    taken = {}
+    for item in MenuItem.objects.order_by('pk'):
+        name = unique_name(item.name, taken.setdefault(item.category_id, set()))
+        if name != item.name:
+            MenuItem.objects.filter(pk=item.pk).update(name=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0002_menuitem_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='menuitem',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='menuitem_category_name_uniq'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_slugs(apps, schema_editor):
+    """
+    Slugifies the names, as menu.models.category_slug does at this point:
+    empty and all-digit slugs get a category- prefix, and names sharing a
+    slug (case, punctuation) get -2, -3... in id order.
+    """
+    Category = apps.get_model('menu', 'Category')
+    taken = set()
+    for category in Category.objects.order_by('pk'):
+        base = slugify(category.name, allow_unicode=True)[:100]
+        if not base or base.isdigit():
+            base = f'category-{base}'.rstrip('-')[:100]
+        slug, number = base, 1
+        while slug in taken:
+            number += 1
+            suffix = f'-{number}'
+            slug = base[:100 - len(suffix)] + suffix
+        taken.add(slug)
+        Category.objects.filter(pk=category.pk).update(slug=slug)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0003_natural_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, default='', editable=False, max_length=100),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='slug',
+            field=models.SlugField(allow_unicode=True, editable=False, max_length=100, unique=True),
+        ),
+    ]
@@ -1,17 +1,79 @@
 from django.db import models
+from django.utils.text import slugify
+
+
+SLUG_LENGTH = 100
+
+
+def category_slug(name):
+    """
+    The slug of a category name. Never empty nor all digits, which ?category=
+    would read as an id.
+    """
+    slug = slugify(name, allow_unicode=True)[:SLUG_LENGTH]
+    if not slug or slug.isdigit():
+        slug = f'category-{slug}'.rstrip('-')[:SLUG_LENGTH]
+    return slug
+
+
+def unique_category_slug(name, taken):
+    """category_slug(name), suffixed -2, -3... until it is not in ``taken``"""
+    base = slug = category_slug(name)
+    number = 1
+    while slug in taken:
+        number += 1
+        suffix = f'-{number}'
+        slug = base[:SLUG_LENGTH - len(suffix)] + suffix
+    return slug
+
+
+def category_filter(value):
+    """MenuItem lookup for a ?category= value: a category id, or a slug (names are slugified)"""
+    value = str(value).strip()
+    if value.isdigit():
+        return {'category_id': int(value)}
+    return {'category__slug': category_slug(value)}
+
 
 class Category(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
+    # Normalized name, the indexed key behind ?category= on the menu
+    slug = models.SlugField(max_length=SLUG_LENGTH, unique=True, allow_unicode=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        # Names differing only in case or punctuation share a slug, suffix the later ones
+        others = Category.objects.exclude(pk=self.pk) if self.pk else Category.objects.all()
+        prefix = category_slug(self.name)[:SLUG_LENGTH - 10]
+        self.slug = unique_category_slug(
+            self.name, set(others.filter(slug__startswith=prefix).values_list('slug', flat=True))
+        )
+        if kwargs.get('update_fields') is not None and 'name' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'slug'}
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.name
 
+class MenuItemQuerySet(models.QuerySet):
+    def in_category(self, value):
+        return self.filter(**category_filter(value))
+
 class MenuItem(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
     price = models.DecimalField(max_digits=6, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     image = models.ImageField(upload_to='menu_images/')
+    # Resized JPEG/WebP copies of image, see menu.images.generate_variants
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    objects = MenuItemQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Natural key used by import_menu to upsert items
+            models.UniqueConstraint(fields=['category', 'name'], name='menuitem_category_name_uniq'),
+        ]
     
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class MenuItemCursorPagination(CursorPagination):
+    """
+    Opt-in keyset pagination by id: the whole menu is returned unless the
+    client asks for a ``page_size``, keeping existing clients unchanged.
+    """
+    ordering = ('id',)
+    page_size = None
+    page_size_query_param = 'page_size'
+    max_page_size = 200
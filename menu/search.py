@@ -0,0 +1,142 @@
+"""
+In-process full-text search over menu item names and descriptions.
+
+``index`` is an inverted index (token -> {item id: weight}) plus a sorted
+token list for prefix lookups, so a query never touches the database. It
+is built on first use, kept current by the MenuItem signals, and rebuilt
+when the menu version moves on without it (changes made by another
+worker, or through bulk_create()/update() which send no signals).
+"""
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from .cache import get_menu_version
+from .models import MenuItem
+
+NAME_WEIGHT = 3.0
+DESCRIPTION_WEIGHT = 1.0
+PREFIX_FACTOR = 0.5  # a prefix match counts half as much as the whole word
+MIN_PREFIX = 3  # shorter terms only match whole words
+MAX_EXPANSIONS = 50  # words a prefix may stand for, shortest first
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lowercased words with accents stripped ("Crème brûlée" -> creme, brulee)"""
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return WORD.findall(text)
+
+
+class SearchIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.version = None
+        self.postings = {}  # token -> {item id: weight}
+        self.tokens = []  # sorted keys of postings
+        self.documents = {}  # item id -> (name, tokens)
+
+    def rebuild(self):
+        with self._lock:
+            # Read the version first: a change landing during the build then
+            # just causes one more rebuild
+            version = get_menu_version()
+            self.version = None
+            self.postings, self.tokens, self.documents = {}, [], {}
+            for pk, name, description in MenuItem.objects.values_list('id', 'name', 'description').iterator():
+                self._add(pk, name, description)
+            self.tokens = sorted(self.postings)
+            self.version = version
+
+    def _add(self, pk, name, description):
+        weights = {}
+        for token in tokenize(name):
+            weights[token] = weights.get(token, 0) + NAME_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+        for token, weight in weights.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                if self.version is not None:  # rebuild() sorts once at the end
+                    insort(self.tokens, token)
+            # Repeats count, with diminishing returns
+            postings[pk] = 1 + math.log(weight)
+        self.documents[pk] = (name, tuple(weights))
+
+    def _remove(self, pk):
+        _, tokens = self.documents.pop(pk, (None, ()))
+        for token in tokens:
+            postings = self.postings[token]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[token]
+                del self.tokens[bisect_left(self.tokens, token)]
+
+    def apply(self, pk, name=None, description=None, deleted=False):
+        """
+        Applies one committed change; run from ``transaction.on_commit``
+        right after the menu version bump for the same change.
+        """
+        with self._lock:
+            if self.version is None:
+                return
+            self._remove(pk)
+            if not deleted:
+                self._add(pk, name, description)
+            self.follow()
+
+    def follow(self):
+        """Adopts the version bump of a change the index already reflects"""
+        with self._lock:
+            # Only our own bump; anything else means someone changed the
+            # menu behind our back and the next search rebuilds.
+            if self.version is not None and get_menu_version() == self.version + 1:
+                self.version += 1
+
+    def expand(self, term):
+        """Indexed words starting with ``term``"""
+        if len(term) < MIN_PREFIX:
+            return [term] if term in self.postings else []
+        start = bisect_left(self.tokens, term)
+        words = self.tokens[start:bisect_left(self.tokens, term + '\U0010ffff', start)]
+        if len(words) > MAX_EXPANSIONS:
+            # The closest completions are the shortest; the word itself comes first
+            words = heapq.nsmallest(MAX_EXPANSIONS, words, key=len)
+        return words
+
+    def search(self, query, limit=20):
+        """Item ids best first; every query word must match a word or, from MIN_PREFIX letters, a word prefix"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            if self.version is None or self.version != get_menu_version():
+                self.rebuild()
+            count = len(self.documents)
+            scores = None
+            for term in terms:
+                matches = {}
+                for token in self.expand(term):
+                    postings = self.postings[token]
+                    factor = math.log(1 + count / len(postings)) * (1 if token == term else PREFIX_FACTOR)
+                    for pk, weight in postings.items():
+                        score = weight * factor
+                        if score > matches.get(pk, 0):
+                            matches[pk] = score
+                if scores is None:
+                    scores = matches
+                else:
+                    scores = {pk: score + matches[pk] for pk, score in scores.items() if pk in matches}
+                if not scores:
+                    return []
+            documents = self.documents
+            return heapq.nsmallest(limit, scores, key=lambda pk: (-scores[pk], documents[pk][0], pk))
+
+
+index = SearchIndex()
@@ -1,14 +1,39 @@
 from rest_framework import serializers
+from tastybites_api.mixins import SparseFieldsMixin
+from tastybites_api.query_budget import QueryBudgetSerializerMixin
+from .images import image_srcset
 from .models import Category, MenuItem
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(QueryBudgetSerializerMixin, serializers.ModelSerializer):
+    query_budget = 1
+
     class Meta:
         model = Category
-        fields = ('id', 'name')
+        fields = ('id', 'name', 'slug')
 
-class MenuItemSerializer(serializers.ModelSerializer):
+class MenuItemSerializer(SparseFieldsMixin, QueryBudgetSerializerMixin, serializers.ModelSerializer):
     category = CategorySerializer()
+    image_srcset = serializers.SerializerMethodField()
+    query_budget = 1  # the queryset itself; categories must be select_related
+    # Model columns behind the fields that are not plain model fields
+    field_columns = {
+        'category': ('category__id', 'category__name', 'category__slug'),
+        'image_srcset': ('image_variants',),
+    }
     
     class Meta:
         model = MenuItem
-        fields = ('id', 'name', 'description', 'price', 'category', 'image')
\ No newline at end of file
+        fields = ('id', 'name', 'description', 'price', 'category', 'image', 'image_srcset')
+
+    @classmethod
+    def setup_queryset(cls, queryset, fields=None):
+        """Joins the category and, for a sparse fieldset, loads only the columns it needs"""
+        if fields is None:
+            return queryset.select_related('category')
+        columns = [column for name in fields for column in cls.field_columns.get(name, (name,))]
+        if 'category' in fields:
+            queryset = queryset.select_related('category')
+        return queryset.only('id', *columns)
+
+    def get_image_srcset(self, obj):
+        return image_srcset(obj.image_variants, self.context.get('request'))
\ No newline at end of file
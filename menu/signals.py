@@ -0,0 +1,49 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_menu_version
+from .images import schedule_variants
+from .models import Category, MenuItem
+from .search import index as search_index
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_snapshot(sender, **kwargs):
+    """Bumps the menu version once the change is committed"""
+    transaction.on_commit(bump_menu_version)
+
+
+# Connected after invalidate_menu_snapshot so the index update runs right
+# after the version bump of the same change, see SearchIndex.apply
+@receiver(post_save, sender=MenuItem)
+def update_search_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(search_index.apply, instance.pk, instance.name, instance.description))
+
+
+@receiver(post_delete, sender=MenuItem)
+def remove_from_search_index(sender, instance, **kwargs):
+    transaction.on_commit(partial(search_index.apply, instance.pk, deleted=True))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def follow_search_index(sender, **kwargs):
+    """Categories are not searched, their version bumps need no rebuild"""
+    transaction.on_commit(search_index.follow)
+
+
+@receiver(post_save, sender=MenuItem)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """Queues thumbnails and WebP copies whenever a new image is committed"""
+    if raw or not instance.image:
+        return
+    if instance.image_variants.get('source') == instance.image.name:
+        return
+    # Resizing takes seconds, it must not hold the request or its transaction
+    transaction.on_commit(partial(schedule_variants, instance.pk, instance.image.name))
@@ -1,3 +1,273 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APITestCase
+
+from . import images
+from .models import Category, MenuItem, category_slug
+
+
+def jpeg(width=800, height=600):
+    buffer = io.BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+class MenuSnapshotTests(APITestCase):
+    def setUp(self):
+        # Snapshots and the menu version outlive the test transactions
+        cache.clear()
+        self.pizza = Category.objects.create(name='Pizza')
+        desserts = Category.objects.create(name='Desserts')
+        MenuItem.objects.create(category=self.pizza, name='Margherita', description='Classic', price='9.50')
+        MenuItem.objects.create(category=desserts, name='Tiramisu', description='Espresso', price='6.00')
+
+    def test_categories_are_built_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category_list'))
+        self.assertEqual([category['name'] for category in response.json()], ['Pizza', 'Desserts'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('category_list')).content, response.content)
+
+    def test_items_are_built_once(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('menu_item_list'))
+        self.assertEqual([item['name'] for item in response.json()], ['Margherita', 'Tiramisu'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('menu_item_list')).content, response.content)
+
+    def test_committed_change_invalidates_the_snapshots(self):
+        self.client.get(reverse('menu_item_list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            MenuItem.objects.create(category=self.pizza, name='Diavola', description='Spicy', price='11.00')
+        self.assertEqual(len(self.client.get(reverse('menu_item_list')).json()), 3)
+
+    def test_snapshots_depend_on_the_host(self):
+        self.client.get(reverse('category_list'))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('category_list'), HTTP_HOST='127.0.0.1')
+
+
+class MenuConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.pizza = Category.objects.create(name='Pizza')
+
+    def test_not_modified(self):
+        for url in (reverse('category_list'), reverse('menu_item_list')):
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_menu_change_changes_the_etag(self):
+        etag = self.client.get(reverse('category_list'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Desserts')
+        response = self.client.get(reverse('category_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+
+class MenuItemListTests(APITestCase):
+    url = reverse('menu_item_list')
+
+    def setUp(self):
+        cache.clear()
+        self.pizza = Category.objects.create(name='Pizza')
+        self.desserts = Category.objects.create(name='Desserts')
+        MenuItem.objects.create(category=self.pizza, name='Margherita', description='Classic', price='9.50')
+        MenuItem.objects.create(category=self.pizza, name='Diavola', description='Spicy', price='11.00')
+        MenuItem.objects.create(category=self.desserts, name='Tiramisu', description='Espresso', price='6.00')
+
+    def names(self, response):
+        data = response.json()
+        return [item['name'] for item in (data['results'] if isinstance(data, dict) else data)]
+
+    def test_category_by_id_slug_or_name(self):
+        for value in (self.desserts.pk, 'desserts', 'Desserts'):
+            with self.subTest(category=value):
+                self.assertEqual(self.names(self.client.get(self.url, {'category': value})), ['Tiramisu'])
+
+    def test_all_digit_category_name_is_reachable_by_slug(self):
+        year = Category.objects.create(name='2024')
+        MenuItem.objects.create(category=year, name='Vintage', description='From the cellar', price='30.00')
+        self.assertEqual(year.slug, 'category-2024')
+        self.assertEqual(self.names(self.client.get(self.url, {'category': year.slug})), ['Vintage'])
+
+    def test_sparse_fieldset(self):
+        response = self.client.get(self.url, {'fields': 'price,name'})
+        self.assertEqual(response.json()[0], {'name': 'Margherita', 'price': '9.50'})
+
+    def test_unknown_field_is_refused(self):
+        response = self.client.get(self.url, {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown fields: secret']})
+
+    def test_cursor_pages(self):
+        first = self.client.get(self.url, {'page_size': 2}).json()
+        self.assertEqual([item['name'] for item in first['results']], ['Margherita', 'Diavola'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([item['name'] for item in second['results']], ['Tiramisu'])
+        self.assertIsNone(second['next'])
+
+    def test_malformed_cursor(self):
+        response = self.client.get(self.url, {'page_size': 2, 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+        # Unpaginated listings ignore the cursor
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 200)
+
+
+
+class MenuSearchTests(APITestCase):
+    url = reverse('menu_search')
+
+    def setUp(self):
+        # A new menu version makes the index rebuild from these rows
+        cache.clear()
+        pizza = Category.objects.create(name='Pizza')
+        desserts = Category.objects.create(name='Desserts')
+        MenuItem.objects.create(category=pizza, name='Margherita', description='Tomato, mozzarella', price='9.50')
+        MenuItem.objects.create(category=pizza, name='Diavola', description='Spicy salami, mozzarella', price='11.00')
+        MenuItem.objects.create(category=desserts, name='Crème brûlée', description='Vanilla custard', price='6.00')
+
+    def names(self, query, **params):
+        return [item['name'] for item in self.client.get(self.url, {'q': query, **params}).json()]
+
+    def test_prefix_search(self):
+        self.assertEqual(self.names('margh'), ['Margherita'])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.names('spicy'), ['Diavola'])
+
+    def test_accents_are_ignored(self):
+        self.assertEqual(self.names('creme brulee'), ['Crème brûlée'])
+
+    def test_limit(self):
+        self.assertEqual(len(self.names('mozzarella', limit=1)), 1)
+        response = self.client.get(self.url, {'q': 'mozzarella', 'limit': 'all'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_required(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+
+
+class CategorySlugTests(TestCase):
+    def test_colliding_names_get_suffixes(self):
+        slugs = [Category.objects.create(name=name).slug for name in ('Pizza', 'pizza!', 'PIZZA')]
+        self.assertEqual(slugs, ['pizza', 'pizza-2', 'pizza-3'])
+
+    def test_renaming_keeps_its_own_slug_free(self):
+        category = Category.objects.create(name='Pizza')
+        category.name = 'Pizza!'
+        category.save()
+        self.assertEqual(category.slug, 'pizza')
+
+    def test_slugs_are_never_empty_nor_ids(self):
+        self.assertEqual(category_slug('!!!'), 'category')
+        self.assertEqual(category_slug('42'), 'category-42')
+
+
+class ImageVariantTests(TransactionTestCase):
+    # Variants are built on the worker thread once the upload commits, so
+    # the saves here have to really commit
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media, MENU_IMAGE_WIDTHS=(320, 640))
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.pizza = Category.objects.create(name='Pizza')
+
+    def wait_for_worker(self):
+        images._worker.submit(lambda: None).result(timeout=30)
+
+    def test_built_once_the_upload_commits(self):
+        item = MenuItem.objects.create(
+            category=self.pizza, name='Margherita', description='Classic', price='9.50',
+            image=SimpleUploadedFile('margherita.jpg', jpeg()),
+        )
+        self.wait_for_worker()
+        item.refresh_from_db()
+        self.assertEqual(item.image_variants['source'], item.image.name)
+        self.assertEqual(set(item.image_variants['webp']), {'320', '640'})
+        self.assertEqual(set(item.image_variants['jpeg']), {'320', '640'})
+
+    def test_small_images_are_not_upscaled(self):
+        item = MenuItem.objects.create(
+            category=self.pizza, name='Margherita', description='Classic', price='9.50',
+            image=SimpleUploadedFile('margherita.jpg', jpeg(400, 300)),
+        )
+        self.wait_for_worker()
+        item.refresh_from_db()
+        self.assertEqual(set(item.image_variants['webp']), {'320', '400'})
+
+    def test_replaced_image_is_not_overwritten(self):
+        # Hold the worker until the image has been replaced
+        release = threading.Event()
+        images._worker.submit(release.wait, 30)
+        item = MenuItem.objects.create(
+            category=self.pizza, name='Margherita', description='Classic', price='9.50',
+            image=SimpleUploadedFile('first.jpg', jpeg()),
+        )
+        MenuItem.objects.filter(pk=item.pk).update(image='menu_images/second.jpg')
+        release.set()
+        self.wait_for_worker()
+        item.refresh_from_db()
+        self.assertEqual(item.image_variants, {})
+
+
+class MenuImportTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.files = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.files)
+        with open(os.path.join(self.files, 'margherita.jpg'), 'wb') as f:
+            f.write(jpeg())
+        self.item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50',
+            image='menu_images/old.jpg', image_variants={'source': 'menu_images/old.jpg'},
+        )
+
+    def run_import(self, image, *args):
+        path = os.path.join(self.files, 'menu.csv')
+        with open(path, 'w', newline='') as f:
+            f.write(f'category,name,description,price,image\nPizza,Margherita,Updated,10.00,{image}\n')
+        call_command('import_menu', path, '--skip-variants', *args, stdout=io.StringIO(), stderr=io.StringIO())
+        self.item.refresh_from_db()
+
+    def test_image_is_copied_under_its_hash(self):
+        self.run_import('margherita.jpg')
+        self.assertRegex(self.item.image.name, r'^menu_images/margherita-[0-9a-f]{12}\.jpg$')
+        self.assertTrue(os.path.isfile(os.path.join(self.media, self.item.image.name)))
+
+    def test_blank_image_keeps_the_current_one(self):
+        self.run_import('')
+        self.assertEqual(self.item.description, 'Updated')
+        self.assertEqual(self.item.image.name, 'menu_images/old.jpg')
+        self.assertEqual(self.item.image_variants, {'source': 'menu_images/old.jpg'})
+
+    def test_failed_image_keeps_the_current_one(self):
+        with self.assertLogs('menu.transfer', 'WARNING'):
+            self.run_import('missing.jpg')
+        self.assertEqual(self.item.description, 'Updated')
+        self.assertEqual(self.item.image.name, 'menu_images/old.jpg')
+
+    def test_dry_run_writes_no_files(self):
+        self.run_import('margherita.jpg', '--dry-run')
+        self.assertEqual(self.item.description, 'Classic')
+        self.assertEqual(os.listdir(self.media), [])
@@ -0,0 +1,248 @@
+"""
+Streaming menu import and export (CSV or JSON Lines).
+
+One record per menu item, keyed by its natural key (category name, item
+name); a record without a name only declares its category. Imports read
+the file in batches, upsert each batch with a single INSERT ... ON
+CONFLICT and copy the referenced images into storage on a thread pool.
+A record whose image is blank or cannot be imported leaves an existing
+item's image alone. Dry runs write nothing, image files included.
+"""
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image
+
+from orders.models import OrderItem
+from .cache import bump_menu_version
+from .images import generate_variants
+from .models import Category, MenuItem, unique_category_slug
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('category', 'name', 'description', 'price', 'image')
+FORMATS = ('csv', 'jsonl')
+UPDATE_FIELDS = ['description', 'price']
+IMAGE_FIELDS = ['image', 'image_variants']
+
+
+class RecordError(ValueError):
+    def __init__(self, line, message):
+        super().__init__(f'line {line}: {message}')
+
+
+def detect_format(path, requested=None):
+    if requested:
+        return requested
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension in ('json', 'jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    raise ValueError(f'Cannot tell the format of {path!r}, pass --format')
+
+
+def read_records(stream, fmt):
+    """Yields ``(line number, record dict)`` without loading the whole file"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        missing = {'category', 'name'} - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"CSV header lacks {', '.join(sorted(missing))}")
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                raise RecordError(number, exc)
+            if not isinstance(record, dict):
+                raise RecordError(number, 'expected a JSON object')
+            yield number, record
+
+
+def write_records(stream, fmt, records):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, FIELDS)
+        writer.writeheader()
+        writer.writerows(records)
+        return
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def export_records(chunk_size=2000):
+    """Every menu item, then categories without items, as import records"""
+    items = MenuItem.objects.order_by('category__name', 'name').values_list(
+        'category__name', 'name', 'description', 'price', 'image'
+    )
+    for category, name, description, price, image in items.iterator(chunk_size=chunk_size):
+        yield {'category': category, 'name': name, 'description': description,
+               'price': str(price), 'image': image}
+    for category in Category.objects.filter(menuitem__isnull=True).order_by('name').values_list('name', flat=True):
+        yield {'category': category, 'name': '', 'description': '', 'price': '', 'image': ''}
+
+
+def copy_image(value, images_dir, storage=default_storage, variants=True, dry_run=False):
+    """
+    Storage name and variants for an import's ``image`` value.
+
+    Local files (relative to ``images_dir``) are copied into storage under a
+    content hash, so re-importing the same file never duplicates it; values
+    naming a file already in storage are kept as they are. A ``dry_run``
+    only checks that a local file is an image and returns the name it would
+    be stored under, without variants.
+    """
+    source = os.path.join(images_dir, value) if images_dir else value
+    if os.path.isfile(source):
+        with open(source, 'rb') as f:
+            content = f.read()
+        stem, extension = posixpath.splitext(os.path.basename(source))
+        name = f'menu_images/{stem}-{hashlib.sha256(content).hexdigest()[:12]}{extension.lower()}'
+        if dry_run:
+            Image.open(io.BytesIO(content)).verify()
+            return name, {}
+        if not storage.exists(name):
+            name = storage.save(name, ContentFile(content))
+    elif storage.exists(value):
+        name = value
+    else:
+        raise FileNotFoundError(f'Image not found: {value}')
+    return name, generate_variants(name, storage) if variants and not dry_run else {}
+
+
+class MenuImporter:
+    def __init__(self, images_dir=None, batch_size=1000, workers=4, variants=True):
+        self.images_dir = images_dir
+        self.batch_size = batch_size
+        self.workers = workers
+        self.variants = variants
+        self.fields = {name: MenuItem._meta.get_field(name) for name in ('name', 'description', 'price')}
+        self.category_field = Category._meta.get_field('name')
+        self.categories = dict(Category.objects.values_list('name', 'pk'))
+        self.images = {}  # import value -> (storage name, variants)
+        self.seen_items = set()
+        self.seen_categories = set()
+        self.created = self.updated = self.image_errors = 0
+        self.kept = 0
+        self.dry_run = False
+
+    def clean(self, line, record):
+        """Validated ``(category, name, description, price, image)`` of a record"""
+        # str() first: JSON numbers would otherwise reach DecimalField as floats
+        values = {key: '' if record.get(key) is None else str(record[key]).strip() for key in FIELDS}
+        try:
+            category = self.category_field.clean(values['category'], None)
+        except ValidationError as exc:
+            raise RecordError(line, f"category: {'; '.join(exc.messages)}")
+        if not values['name']:
+            return category, None, None, None, None
+        cleaned = {}
+        for key, field in self.fields.items():
+            try:
+                cleaned[key] = field.clean(values[key], None)
+            except ValidationError as exc:
+                raise RecordError(line, f"{key}: {'; '.join(exc.messages)}")
+        name, description, price = cleaned['name'], cleaned['description'], cleaned['price']
+        if price < 0:
+            raise RecordError(line, 'price must not be negative')
+        return category, name, description, price, values['image']
+
+    def run(self, records, prune=False, dry_run=False):
+        self.dry_run = dry_run
+        with transaction.atomic():
+            self.existing_items = set(MenuItem.objects.values_list('pk', flat=True))
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                records = iter(records)
+                while batch := list(islice(records, self.batch_size)):
+                    self.import_batch([self.clean(line, record) for line, record in batch], pool)
+            self.deleted = self.prune() if prune else (0, 0)
+            if dry_run:
+                transaction.set_rollback(True)
+            else:
+                # bulk_create() skips the signals that bump the menu version
+                transaction.on_commit(bump_menu_version)
+
+    def import_batch(self, rows, pool):
+        pending = list({image for *_, image in rows if image and image not in self.images})
+        for image, result in zip(pending, pool.map(self.ingest_image, pending)):
+            if result is None:
+                self.image_errors += 1
+                result = ('', {})
+            self.images[image] = result
+
+        new_categories = {row[0] for row in rows} - self.categories.keys()
+        created = []
+        if new_categories:
+            # Names differing only in case or punctuation share a slug
+            slugs = set(Category.objects.values_list('slug', flat=True))
+            for name in sorted(new_categories):
+                slug = unique_category_slug(name, slugs)
+                slugs.add(slug)
+                created.append(Category(name=name, slug=slug))
+        for category in Category.objects.bulk_create(created):
+            self.categories[category.name] = category.pk
+        self.seen_categories.update(self.categories[row[0]] for row in rows)
+
+        # The last record wins when a key repeats within the batch
+        items = {}
+        for category, name, description, price, image in rows:
+            if name is None:
+                continue
+            stored, variants = self.images[image] if image else ('', {})
+            items[(category, name)] = MenuItem(
+                category_id=self.categories[category], name=name, description=description,
+                price=price, image=stored, image_variants=variants,
+            )
+        # Items without a usable image keep the one they have
+        with_image = [item for item in items.values() if item.image]
+        without_image = [item for item in items.values() if not item.image]
+        saved = []
+        for batch, update_fields in ((with_image, UPDATE_FIELDS + IMAGE_FIELDS), (without_image, UPDATE_FIELDS)):
+            if batch:
+                saved += MenuItem.objects.bulk_create(
+                    batch, update_conflicts=True,
+                    unique_fields=['category', 'name'], update_fields=update_fields,
+                )
+        for item in saved:
+            if item.pk in self.existing_items:
+                self.updated += 1
+            elif item.pk not in self.seen_items:
+                self.created += 1
+            self.seen_items.add(item.pk)
+
+    def ingest_image(self, value):
+        try:
+            return copy_image(value, self.images_dir, variants=self.variants, dry_run=self.dry_run)
+        except OSError:
+            logger.warning('Skipping image %s', value, exc_info=True)
+            return None
+
+    def prune(self, chunk_size=500):
+        """
+        Deletes items missing from the import, except those referenced by
+        orders (``OrderItem.item`` is PROTECT), then categories left empty.
+        """
+        stale = sorted(self.existing_items - self.seen_items)
+        deleted = 0
+        for start in range(0, len(stale), chunk_size):
+            deleted += MenuItem.objects.filter(pk__in=stale[start:start + chunk_size]).exclude(
+                pk__in=OrderItem.objects.values('item_id')
+            ).delete()[1].get(MenuItem._meta.label, 0)
+        self.kept = len(stale) - deleted
+        # Categories named in the import stay even when they are empty
+        categories = Category.objects.filter(menuitem__isnull=True).exclude(pk__in=self.seen_categories)
+        return deleted, categories.delete()[1].get(Category._meta.label, 0)
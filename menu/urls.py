@@ -1,7 +1,8 @@
 from django.urls import path
-from .views import CategoryListView, MenuItemListView
+from .views import CategoryListView, MenuItemListView, MenuSearchView
 
 urlpatterns = [
     path('categories/', CategoryListView.as_view(), name='category_list'),
     path('items/', MenuItemListView.as_view(), name='menu_item_list'),
+    path('search/', MenuSearchView.as_view(), name='menu_search'),
 ]
\ No newline at end of file
@@ -1,19 +1,111 @@
 # Create your views here.
+from django.http import HttpResponse
 from rest_framework import generics
-from .models import Category, MenuItem
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from tastybites_api.mixins import ConditionalGetMixin
+from tastybites_api.query_budget import QueryBudgetMixin
+from .cache import get_categories_snapshot, get_menu_items_snapshot, get_menu_version
+from .models import Category, MenuItem, category_filter
+from .pagination import MenuItemCursorPagination
+from .search import index as search_index
 from .serializers import CategorySerializer, MenuItemSerializer
 
-class CategoryListView(generics.ListAPIView):
+class MenuVersionETagMixin(ConditionalGetMixin):
+    def get_etag(self, request, *args, **kwargs):
+        """The menu version identifies every representation of the menu"""
+        return f'{get_menu_version()}:{request.accepted_renderer.format}'
+
+class CategoryListView(QueryBudgetMixin, MenuVersionETagMixin, generics.ListAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
+    query_budget = 1  # only when the snapshot has to be rebuilt
+
+    def list(self, request, *args, **kwargs):
+        """Serves JSON straight from the versioned menu snapshot"""
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return HttpResponse(get_categories_snapshot(request), content_type='application/json')
 
-class MenuItemListView(generics.ListAPIView):
-    queryset = MenuItem.objects.all()
+class MenuItemListView(QueryBudgetMixin, MenuVersionETagMixin, generics.ListAPIView):
+    queryset = MenuItem.objects.order_by('id')
     serializer_class = MenuItemSerializer
+    pagination_class = MenuItemCursorPagination
+    query_budget = 1  # only when the snapshot has to be rebuilt
+
+    def get_requested_fields(self):
+        """The ``?fields=`` sparse fieldset in serializer order, None for all fields"""
+        if not hasattr(self, '_requested_fields'):
+            value = self.request.query_params.get('fields', '')
+            requested = {name.strip() for name in value.split(',') if name.strip()}
+            unknown = requested.difference(MenuItemSerializer.Meta.fields)
+            if unknown:
+                raise ValidationError({'fields': [f"Unknown fields: {', '.join(sorted(unknown))}"]})
+            self._requested_fields = tuple(
+                name for name in MenuItemSerializer.Meta.fields if name in requested
+            ) or None
+        return self._requested_fields
     
     def get_queryset(self):
         queryset = super().get_queryset()
         category = self.request.query_params.get('category')
         if category:
-            queryset = queryset.filter(category__name__iexact=category)
-        return queryset
\ No newline at end of file
+            queryset = queryset.in_category(category)
+        return MenuItemSerializer.setup_queryset(queryset, self.get_requested_fields())
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def get_snapshot_params(self, request):
+        category = request.query_params.get('category')
+        page_size = self.paginator.get_page_size(request)
+        # Key on the decoded position (404 when malformed) so every spelling
+        # of a cursor shares one snapshot; unpaginated listings ignore it
+        cursor = self.paginator.decode_cursor(request) if page_size else None
+        return {
+            'category': category_filter(category) if category else None,
+            'fields': self.get_requested_fields(),
+            'page_size': page_size,
+            'cursor': tuple(cursor) if cursor else None,
+        }
+
+    def list(self, request, *args, **kwargs):
+        """Serves JSON straight from the versioned menu snapshot"""
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        body = get_menu_items_snapshot(
+            request, self.get_snapshot_params(request),
+            lambda: super(MenuItemListView, self).list(request, *args, **kwargs).data
+        )
+        return HttpResponse(body, content_type='application/json')
+
+
+class MenuSearchView(QueryBudgetMixin, generics.GenericAPIView):
+    """Ranked, prefix-aware search over item names and descriptions"""
+    serializer_class = MenuItemSerializer
+    query_budget = 2  # the matches, plus an index rebuild after a menu change
+    default_limit = 20
+    max_limit = 50
+
+    def get_limit(self):
+        value = self.request.query_params.get('limit')
+        if value is None:
+            return self.default_limit
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({'limit': ['A positive integer is required.']})
+        return min(limit, self.max_limit)
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ValidationError({'q': ['This query parameter is required.']})
+        ids = search_index.search(query, self.get_limit())
+        # The index may be a commit ahead of a deleted row, skip those
+        items = MenuItem.objects.select_related('category').in_bulk(ids)
+        matches = [items[pk] for pk in ids if pk in items]
+        return Response(self.get_serializer(matches, many=True).data)
@@ -1,5 +1,70 @@
 from django.contrib import admin
+from tastybites_api.admin import LargeTableAdmin
 from .models import Address, Order, OrderItem
-admin.site.register(Address)
-admin.site.register(Order)
-admin.site.register(OrderItem)
\ No newline at end of file
+from .events import status_changed
+from .rollups import rebuild_order_days
+
+
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    raw_id_fields = ('item',)
+
+    def get_queryset(self, request):
+        # Each row's label is OrderItem.__str__, which reads item.name
+        return super().get_queryset(request).select_related('item')
+
+
+@admin.register(Order)
+class OrderAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'status', 'payment_method', 'total', 'created_at', 'is_active')
+    list_select_related = ('user',)
+    # Each status filter and date drill-down reads the (status, created_at)
+    # or (created_at) index in the changelist's order
+    list_filter = ('status', 'payment_method')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    search_fields = ('=id', '=user__email')
+    raw_id_fields = ('user', 'address')
+    readonly_fields = ('created_at', 'updated_at', 'canceled_at')
+    inlines = [OrderItemInline]
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Any field or line may have changed, recount the order's day
+        rebuild_order_days(form.instance)
+        if change and 'status' in form.changed_data:
+            status_changed(form.instance, form.initial['status'])
+
+
+@admin.register(OrderItem)
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ('id', 'order', 'item', 'quantity', 'price')
+    list_select_related = ('order', 'item')
+    search_fields = ('=order__id',)
+    raw_id_fields = ('order', 'item')
+
+    # Line edits change the sales rollups of the order's day
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        orders = [obj.order]
+        if change and 'order' in form.changed_data:
+            orders.append(Order.objects.get(pk=form.initial['order']))
+        rebuild_order_days(*orders)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        rebuild_order_days(obj.order)
+
+    def delete_queryset(self, request, queryset):
+        orders = list(Order.objects.filter(pk__in=queryset.values('order_id')))
+        super().delete_queryset(request, queryset)
+        rebuild_order_days(*orders)
+
+
+@admin.register(Address)
+class AddressAdmin(LargeTableAdmin):
+    list_display = ('id', 'user', 'street_address', 'city', 'phone', 'default')
+    list_select_related = ('user',)
+    search_fields = ('=user__email',)
+    raw_id_fields = ('user',)
@@ -0,0 +1,128 @@
+"""
+The kitchen board event stream as a bare ASGI app.
+
+``tastybites_api.asgi`` routes ``GET /api/orders/events/`` here instead
+of through Django: Django's ASGI handler gives every request a thread of
+its own for sync work (MiddlewareMixin hooks, signal receivers) and keeps
+it for as long as the response streams, so a thousand open boards would
+hold a thousand threads. Here an open board is one coroutine; the only
+thread hops are the user lookups of ``authorize``, once on connect. ``OrderEventStreamView`` answers the same URL elsewhere
+(WSGI) with the missed events only.
+"""
+import asyncio
+import io
+import json
+import re
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from corsheaders.conf import conf as cors_conf
+from django.conf import settings
+from django.contrib.auth import aget_user
+from django.core.handlers.asgi import ASGIRequest
+from django.urls import reverse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from accounts.authentication import StatelessJWTAuthentication
+from .events import broker, stream
+
+SSE_HEADERS = [
+    (b'content-type', b'text/event-stream'),
+    (b'cache-control', b'no-cache'),
+    (b'x-accel-buffering', b'no'),  # nginx would buffer the stream otherwise
+]
+
+
+class NotAllowed(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail if isinstance(detail, dict) else {'detail': detail}
+
+
+async def authorize(request):
+    """
+    The staff user behind a JWT Authorization header (its staff and active
+    flags from the cached user row) or, for browser EventSource clients
+    that cannot send headers, the session cookie; raises NotAllowed otherwise.
+    """
+    try:
+        authenticated = await sync_to_async(StatelessJWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as exc:
+        raise NotAllowed(401, exc.detail)
+    if authenticated is not None:
+        user = authenticated[0]
+    else:
+        if not hasattr(request, 'session'):
+            engine = import_module(settings.SESSION_ENGINE)
+            request.session = engine.SessionStore(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        user = await aget_user(request)
+        if not user.is_authenticated:
+            raise NotAllowed(401, 'Authentication credentials were not provided.')
+    if not user.is_staff:
+        raise NotAllowed(403, 'You do not have permission to perform this action.')
+    return user
+
+
+def last_event_id(request):
+    return request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+
+
+def cors_headers(request):
+    # Preflights go through Django and CorsMiddleware, this is the GET itself
+    origin = request.headers.get('Origin')
+    if not origin:
+        return []
+    allowed = (cors_conf.CORS_ALLOW_ALL_ORIGINS or origin in cors_conf.CORS_ALLOWED_ORIGINS
+               or any(re.match(pattern, origin) for pattern in cors_conf.CORS_ALLOWED_ORIGIN_REGEXES))
+    if not allowed:
+        return []
+    headers = [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'origin')]
+    if cors_conf.CORS_ALLOW_CREDENTIALS:
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
+
+
+async def event_stream(scope, receive, send):
+    request = ASGIRequest(scope, io.BytesIO())
+    try:
+        await authorize(request)
+    except NotAllowed as exc:
+        await send({'type': 'http.response.start', 'status': exc.status,
+                    'headers': [(b'content-type', b'application/json'), *cors_headers(request)]})
+        await send({'type': 'http.response.body', 'body': json.dumps(exc.detail, cls=JSONEncoder).encode()})
+        return
+
+    events = stream(broker.subscribe(last_event_id(request)))
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [*SSE_HEADERS, *cors_headers(request)]})
+
+    async def forward():
+        async for chunk in events:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def disconnected():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    tasks = [asyncio.ensure_future(forward()), asyncio.ensure_future(disconnected())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await events.aclose()  # unsubscribes
+
+
+def route(django_application):
+    """The ASGI app: the event stream beside ``django_application``"""
+    path = reverse('order_events')
+
+    async def application(scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == path:
+            return await event_stream(scope, receive, send)
+        return await django_application(scope, receive, send)
+
+    return application
@@ -0,0 +1,206 @@
+"""
+In-process pub/sub of order events for the kitchen board stream.
+
+Events are published once their transaction commits, encoded once as an
+SSE frame and fanned out to every subscriber, each an asyncio task of
+``OrderEventStreamView`` on the ASGI server's event loop; an idle client is
+a coroutine and a small buffer, not a thread.
+
+Each subscriber buffers at most ORDER_EVENTS_CLIENT_BUFFER undelivered
+events. One that falls further behind (a slow or stalled connection) gets
+an ``overflow`` event and is disconnected; the browser reconnects with
+``Last-Event-ID`` and catches up from the last ORDER_EVENTS_REPLAY events
+kept here, or gets ``reset`` (reload the board) when it missed more.
+
+The broker lives in one process: run the board on a single ASGI worker or
+replace ``broker`` with a shared one before scaling out.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from tastybites_api.renderers import FastJSONRenderer
+
+CREATED = 'order.created'
+STATUS_CHANGED = 'order.status_changed'
+CANCELED = 'order.canceled'
+
+
+def frame(event_type, data=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f"data: {FastJSONRenderer().render(data or {}).decode()}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscription:
+    """Undelivered events of one client, filled by the broker on the client's event loop"""
+
+    def __init__(self, loop, limit, start=0):
+        self.loop = loop
+        self.limit = limit
+        self.start = start  # last sequence in the backlog, later ones arrive live
+        self.pending = deque()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.backlog = []
+
+    def deliver(self, events):
+        """Queues the frames of ``events`` ((sequence, frame) pairs) not already in the backlog"""
+        frames = [event for sequence, event in events if sequence > self.start]
+        if not frames:
+            return
+        if len(self.pending) + len(frames) > self.limit:
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending.extend(frames)
+        self.ready.set()
+
+    async def receive(self, timeout):
+        """The pending frames, an empty list after ``timeout`` seconds without any"""
+        if not self.pending and not self.overflowed:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except TimeoutError:
+                return []
+        self.ready.clear()
+        frames = list(self.pending)
+        self.pending.clear()
+        return frames
+
+
+class OrderEventBroker:
+    def __init__(self, replay=None):
+        self._lock = threading.Lock()
+        # Ids are "<epoch>-<sequence>", so ids from before a restart are
+        # recognised as unknown instead of being confused with new ones
+        self.epoch = format(time.time_ns() // 1_000_000, 'x')
+        self.sequence = 0
+        self.replay = deque(maxlen=replay or settings.ORDER_EVENTS_REPLAY)  # (sequence, frame)
+        self.subscribers = {}  # event loop -> set of subscriptions
+
+    def publish(self, event_type, data):
+        with self._lock:
+            self.sequence += 1
+            event = (self.sequence, frame(event_type, data, f'{self.epoch}-{self.sequence}'))
+            self.replay.append(event)
+            closed = []
+            for loop in self.subscribers:
+                # One wakeup per loop, however many clients it serves; queued
+                # under the lock so each loop gets the events in order
+                try:
+                    loop.call_soon_threadsafe(self._fan_out, loop, [event])
+                except RuntimeError:  # loop closed
+                    closed.append(loop)
+            for loop in closed:
+                del self.subscribers[loop]
+
+    def publish_on_commit(self, event_type, data):
+        transaction.on_commit(partial(self.publish, event_type, data))
+
+    def _fan_out(self, loop, events):
+        with self._lock:
+            subscriptions = list(self.subscribers.get(loop, ()))
+        for subscription in subscriptions:
+            subscription.deliver(events)
+
+    def subscribe(self, last_event_id=None, limit=None):
+        """A subscription on the running event loop, its backlog from catch_up()"""
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(loop, limit or settings.ORDER_EVENTS_CLIENT_BUFFER)
+        with self._lock:
+            # Under the lock so no event falls between the backlog and the live
+            # ones; those already published but not yet fanned out are in the
+            # backlog and skipped by deliver()
+            subscription.backlog = self._catch_up(last_event_id)
+            subscription.start = self.sequence
+            self.subscribers.setdefault(loop, set()).add(subscription)
+        return subscription
+
+    def catch_up(self, last_event_id=None):
+        with self._lock:
+            return self._catch_up(last_event_id)
+
+    def _catch_up(self, last_event_id):
+        """
+        The frames a client needs first: the events after ``last_event_id``,
+        or a reset when those are gone. New clients get the current id (an
+        id-only frame dispatches nothing), so reconnects replay from there.
+        """
+        current = f'{self.epoch}-{self.sequence}'
+        if last_event_id is None:
+            return [f'id: {current}\n\n']
+        epoch, _, sequence = last_event_id.partition('-')
+        if epoch == self.epoch and sequence.isdigit():
+            sequence = int(sequence)
+            oldest = self.replay[0][0] if self.replay else self.sequence + 1
+            if oldest - 1 <= sequence <= self.sequence:
+                return [event for number, event in self.replay if number > sequence]
+        return [frame('reset', {'reason': 'Events since Last-Event-ID are no longer available'}, current)]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self.subscribers.get(subscription.loop)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.loop]
+
+    def client_count(self):
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self.subscribers.values())
+
+
+broker = OrderEventBroker()
+
+
+async def stream(subscription, keepalive=None):
+    """SSE text for one subscription, until the client goes away or overflows"""
+    keepalive = keepalive or settings.ORDER_EVENTS_KEEPALIVE
+    try:
+        yield f'retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n' + ''.join(subscription.backlog)
+        while True:
+            frames = await subscription.receive(keepalive)
+            if subscription.overflowed:
+                yield frame('overflow', {'reason': 'Client fell behind, reconnect with Last-Event-ID'})
+                return
+            # A comment line keeps proxies from timing out idle connections
+            yield ''.join(frames) if frames else ': keepalive\n\n'
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def order_summary(order, lines):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'created_at': order.created_at,
+        'payment_method': order.payment_method,
+        'total': str(order.total),
+        'special_notes': order.special_notes,
+        'items': [
+            {'item': line.item_id, 'name': line.item.name, 'quantity': line.quantity,
+             'special_instructions': line.special_instructions}
+            for line in lines
+        ],
+    }
+
+
+def order_created(order, lines):
+    broker.publish_on_commit(CREATED, order_summary(order, lines))
+
+
+def status_changed(order, previous_status):
+    if order.status == previous_status:
+        return
+    broker.publish_on_commit(CANCELED if order.status == 'canceled' else STATUS_CHANGED, {
+        'id': order.id, 'status': order.status, 'previous_status': previous_status,
+        'updated_at': order.updated_at,
+    })
@@ -0,0 +1,127 @@
+"""
+Read-only order serialization from ``.values()`` rows.
+
+Produces exactly the JSON of ``OrderSerializer`` without building model
+instances or dispatching DRF fields per object; the
+``check_order_serializers`` command verifies and benchmarks the two.
+"""
+from decimal import Decimal
+
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from menu.images import image_srcset
+from tastybites_api.metrics import measured_serialization
+from .models import Order, OrderItem
+
+ORDER_VALUES = (
+    'id', 'user_id', 'address_id', 'created_at', 'updated_at',
+    'payment_method', 'total', 'status', 'canceled_at', 'is_active',
+    'special_notes', 'address__street_address', 'address__apartment',
+    'address__city', 'address__phone', 'address__default',
+)
+
+ITEM_VALUES = (
+    'id', 'order_id', 'quantity', 'price', 'special_instructions',
+    'item_id', 'item__name', 'item__description', 'item__price',
+    'item__image', 'item__image_variants', 'item__category_id',
+    'item__category__name', 'item__category__slug',
+)
+
+STATUS_DISPLAY = dict(Order.STATUS_CHOICES)
+
+
+def _decimal(value):
+    return '{:f}'.format(value)
+
+
+def _datetime(value, tz):
+    if not value:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def order_rows(queryset):
+    """Turns an Order queryset into the rows serialize_order_rows expects"""
+    return queryset.select_related(None).prefetch_related(None).values(*ORDER_VALUES)
+
+
+@measured_serialization
+def serialize_order_rows(rows, request=None):
+    """Same output as ``OrderSerializer(many=True)`` for the given rows"""
+    rows = list(rows)
+    if not rows:
+        return []
+
+    tz = timezone.get_current_timezone()
+    image_urls = {}
+    variant_urls = {}
+
+    def image_url(name):
+        if not name:
+            return None
+        if name not in image_urls:
+            url = default_storage.url(name)
+            image_urls[name] = request.build_absolute_uri(url) if request is not None else url
+        return image_urls[name]
+
+    items_by_order = {row['id']: [] for row in rows}
+    item_rows = OrderItem.objects.filter(
+        order_id__in=items_by_order
+    ).order_by('id').values_list(*ITEM_VALUES)
+    for (pk, order_id, quantity, price, instructions, item_id, name, description,
+         item_price, image, image_variants, category_id, category_name, category_slug) in item_rows:
+        items_by_order[order_id].append({
+            'id': pk,
+            'item': {
+                'id': item_id,
+                'name': name,
+                'description': description,
+                'price': _decimal(item_price),
+                'category': {'id': category_id, 'name': category_name, 'slug': category_slug},
+                'image': image_url(image),
+                'image_srcset': image_srcset(image_variants, request, variant_urls),
+            },
+            'quantity': quantity,
+            'price': _decimal(price),
+            'subtotal': Decimal(str(price)) * Decimal(str(quantity)),
+            'special_instructions': instructions,
+        })
+
+    data = []
+    for row in rows:
+        address = None
+        if row['address_id'] is not None:
+            street, apartment, city = (
+                row['address__street_address'], row['address__apartment'], row['address__city']
+            )
+            address = {
+                'id': row['address_id'],
+                'street_address': street,
+                'apartment': apartment,
+                'city': city,
+                'phone': row['address__phone'],
+                'default': row['address__default'],
+                'full_address': ', '.join([street, apartment, city] if apartment else [street, city]),
+            }
+        status = row['status']
+        data.append({
+            'id': row['id'],
+            'user': row['user_id'],
+            'address': address,
+            'created_at': _datetime(row['created_at'], tz),
+            'updated_at': _datetime(row['updated_at'], tz),
+            'payment_method': row['payment_method'],
+            'total': _decimal(row['total']),
+            'status': status,
+            'status_display': STATUS_DISPLAY.get(status, status),
+            'canceled_at': _datetime(row['canceled_at'], tz),
+            'is_active': row['is_active'],
+            'special_notes': row['special_notes'],
+            'items': items_by_order[row['id']],
+            'can_cancel': status == 'pending',
+        })
+    return data
@@ -0,0 +1,60 @@
+"""
+Idempotency-Key records of order placements.
+
+Expired keys are swept in the background of the orders placed with a key:
+after a sampled IDEMPOTENCY_SWEEP_RATE of them commit, one batch of expired
+keys is deleted, so no scheduler is needed. ``purge_idempotency_keys``
+removes them all on demand.
+"""
+import hashlib
+import json
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from tastybites_api.query_budget import unbudgeted
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+SWEEP_BATCH = 500
+
+
+def get_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+
+
+def request_fingerprint(data):
+    """Stable hash of the parsed request body"""
+    payload = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def expired_keys():
+    return IdempotencyKey.objects.filter(created_at__lt=timezone.now() - get_ttl())
+
+
+def purge_expired_keys(limit=None):
+    """Deletes the expired keys, at most ``limit`` of them; returns how many"""
+    keys = expired_keys()
+    if limit is not None:
+        keys = IdempotencyKey.objects.filter(pk__in=keys.order_by('created_at').values('pk')[:limit])
+    return keys.delete()[0]
+
+
+def sweep_expired_keys():
+    """A sampled purge_expired_keys() batch, run once a keyed order committed"""
+    if random.random() < getattr(settings, 'IDEMPOTENCY_SWEEP_RATE', 0.01):
+        # Amortized over many requests, not charged to this one's budget
+        with unbudgeted():
+            purge_expired_keys(SWEEP_BATCH)
+
+
+def find_key(user, key):
+    """Returns the live record for ``key``, discarding it if it has expired"""
+    record = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if record is not None and record.created_at < timezone.now() - get_ttl():
+        record.delete()
+        return None
+    return record
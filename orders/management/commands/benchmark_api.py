@@ -0,0 +1,186 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+from tastybites_api.benchmark import DRIVERS, BenchmarkData, compare, run_scenario, scenarios, select
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every API endpoint in-process through the WSGI and ASGI applications, '
+        'against a throwaway test database'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interfaces', nargs='+', choices=sorted(DRIVERS), default=['wsgi', 'asgi'])
+        parser.add_argument('--scenarios', nargs='+', metavar='PATTERN',
+                            help='Only run scenarios matching these glob patterns, e.g. "orders.*"')
+        parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests per scenario')
+        parser.add_argument('--password-iterations', type=int, default=10,
+                            help='Timed requests for scenarios that hash a password (register, login)')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests before each scenario')
+        parser.add_argument('--history', default='10,1000,10000',
+                            help='Comma separated order history sizes for the order list scenarios')
+        parser.add_argument('--on-disk', action='store_true',
+                            help='Use a SQLite file instead of an in-memory test database')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Requests in flight at once (threads under WSGI); needs --on-disk above 1')
+        parser.add_argument('--plain-sqlite', action='store_true',
+                            help="Ignore the OPTIONS and CONN_MAX_AGE of settings.DATABASES (default SQLite, "
+                                 "a baseline for the tuned profile)")
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', metavar='BASELINE', help='Compare against a previous JSON result')
+        parser.add_argument('--max-regression', type=float, metavar='PCT',
+                            help='With --compare, fail on a p95 regression above PCT percent, '
+                                 'on more queries per request, or on errors')
+        parser.add_argument('--noise-ms', type=float, default=1.0,
+                            help='Ignore p95 regressions smaller than this many milliseconds')
+
+    def handle(self, *args, **options):
+        try:
+            history = sorted({int(size) for size in options['history'].split(',') if size.strip()})
+        except ValueError:
+            raise CommandError(f"--history expects comma separated integers, got {options['history']!r}")
+        selected = select(scenarios(history), options['scenarios'])
+        if options['list']:
+            for scenario in selected:
+                self.stdout.write(scenario.name)
+            return
+        if not selected:
+            raise CommandError('No scenario matches --scenarios')
+        if options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1')
+        if options['concurrency'] > 1 and not options['on_disk']:
+            raise CommandError('--concurrency needs --on-disk, threads cannot share the in-memory database')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        # Production-like request handling: no budget checks, query
+        # inspection or DEBUG query log skewing the numbers.
+        overrides = override_settings(
+            DEBUG=False, QUERY_BUDGET_ENFORCE=False, QUERY_BUDGET_LOG=False, QUERY_INSPECTION_SAMPLE_RATE=0.0,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        )
+        with overrides, self.test_database(options['on_disk'], options['plain_sqlite']):
+            cache.clear()
+            self.stdout.write('Creating benchmark data...')
+            data = BenchmarkData(history)
+            results = {}
+            for name in options['interfaces']:
+                driver = DRIVERS[name]()
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.write_header()
+                results[name] = {}
+                for scenario in selected:
+                    iterations = (options['password_iterations'] if scenario.hashes_password
+                                  else options['iterations'])
+                    result = run_scenario(
+                        driver, scenario, data, iterations, options['warmup'], options['concurrency']
+                    )
+                    results[name][scenario.name] = result
+                    self.write_row(scenario.name, result)
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': 'sqlite file' if options['on_disk'] else 'sqlite memory',
+                'sqlite_profile': 'plain' if options['plain_sqlite'] else 'settings',
+                'concurrency': options['concurrency'],
+                'iterations': options['iterations'],
+                'password_iterations': options['password_iterations'],
+                'warmup': options['warmup'],
+                'history': history,
+            },
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        errors = [f'{interface} {name}' for interface, rows in results.items()
+                  for name, result in rows.items() if result['errors']]
+        if errors:
+            self.stdout.write(self.style.WARNING('Unexpected status codes in: ' + ', '.join(errors)))
+
+        if baseline is not None:
+            self.write_comparison(baseline, report, options)
+
+    @contextmanager
+    def test_database(self, on_disk, plain):
+        path = None
+        if on_disk:
+            fd, path = tempfile.mkstemp(prefix='tastybites-bench-', suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict['TEST']['NAME'] = path
+        if plain:
+            # Every thread's connection is made from this same dict
+            connection.close()
+            connection.settings_dict.update(OPTIONS={}, CONN_MAX_AGE=0)
+        self.stdout.write('Creating test database...')
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            if path:
+                for name in (path, f'{path}-wal', f'{path}-shm'):
+                    if os.path.exists(name):
+                        os.remove(name)
+
+    def write_header(self):
+        self.stdout.write(
+            f"  {'scenario':<26} {'req':>5} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'req/s':>8} {'queries':>8}"
+        )
+
+    def write_row(self, name, result):
+        line = (
+            f"  {name:<26} {result['requests']:>5} {result['errors']:>4} {result['p50_ms']:>8.2f} "
+            f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} {result['throughput_rps']:>8.1f} "
+            f"{result['queries_per_request']:>8g}"
+        )
+        self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+
+    def write_comparison(self, baseline, report, options):
+        rows, regressions = compare(baseline, report, options['max_regression'], options['noise_ms'])
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"Compared with {options['compare']} (revision {baseline['meta'].get('revision')})"
+        ))
+        for interface, name, before, now, deltas in rows:
+            self.stdout.write(
+                f"  {interface} {name:<26} p50 {deltas['p50_ms']:+6.1f}%  p95 {deltas['p95_ms']:+6.1f}%  "
+                f"p99 {deltas['p99_ms']:+6.1f}%  queries {before['queries_per_request']:g} -> "
+                f"{now['queries_per_request']:g}"
+            )
+        if options['max_regression'] is None:
+            return
+        if regressions:
+            raise CommandError('Benchmark regressions:\n' + '\n'.join(f'  {r}' for r in regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
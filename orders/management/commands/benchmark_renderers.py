@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from menu.models import MenuItem
+from menu.serializers import MenuItemSerializer
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from orders.views import ORDER_ITEMS_PREFETCH
+from tastybites_api.renderers import FastJSONRenderer
+
+class Command(BaseCommand):
+    help = 'Compare DRF JSONRenderer and FastJSONRenderer on order lists and the full menu'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help='Orders in the rendered list')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per renderer')
+
+    def handle(self, *args, **options):
+        request = Request(APIRequestFactory().get('/'))
+        orders = Order.objects.select_related('address').prefetch_related(
+            ORDER_ITEMS_PREFETCH
+        ).order_by('-created_at', '-id')[:options['orders']]
+        payloads = {
+            'order list': OrderSerializer(orders, many=True, context={'request': request}).data,
+            'full menu': MenuItemSerializer(
+                MenuItem.objects.select_related('category'), many=True, context={'request': request}
+            ).data,
+        }
+
+        for name, data in payloads.items():
+            if not data:
+                self.stdout.write(self.style.WARNING(f'{name}: nothing to render, skipped'))
+                continue
+            stdlib, fast = JSONRenderer().render(data), FastJSONRenderer().render(data)
+            if stdlib != fast:
+                raise CommandError(f'{name}: renderers disagree')
+
+            timings = {}
+            for renderer in (JSONRenderer(), FastJSONRenderer()):
+                best = float('inf')
+                for _ in range(options['repeat']):
+                    start = time.perf_counter()
+                    renderer.render(data)
+                    best = min(best, time.perf_counter() - start)
+                timings[type(renderer).__name__] = best
+            self.stdout.write(
+                f'{name} ({len(data)} objects, {len(fast)} bytes): '
+                f"JSONRenderer {timings['JSONRenderer'] * 1000:.2f} ms, "
+                f"FastJSONRenderer {timings['FastJSONRenderer'] * 1000:.2f} ms "
+                f"({timings['JSONRenderer'] / timings['FastJSONRenderer']:.1f}x)"
+            )
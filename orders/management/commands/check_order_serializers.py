@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from orders.fast_serializers import order_rows, serialize_order_rows
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from orders.views import ORDER_ITEMS_PREFETCH
+
+class Command(BaseCommand):
+    help = 'Verify the values() order serializer matches OrderSerializer and compare their speed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help='Number of orders to serialize')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per serializer')
+
+    def handle(self, *args, **options):
+        # A host build_absolute_uri() accepts, for image URLs
+        host = next((host for host in settings.ALLOWED_HOSTS if not host.startswith('.') and host != '*'), 'localhost')
+        request = Request(APIRequestFactory().get('/api/orders/', SERVER_NAME=host))
+        ids = list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)[:options['orders']])
+        if not ids:
+            raise CommandError('No orders to serialize, load some data first')
+        queryset = Order.objects.filter(id__in=ids).order_by('-created_at', '-id')
+        renderer = JSONRenderer()
+
+        def model_path():
+            orders = queryset.select_related('address').prefetch_related(ORDER_ITEMS_PREFETCH)
+            return OrderSerializer(orders, many=True, context={'request': request}).data
+
+        def fast_path():
+            return serialize_order_rows(order_rows(queryset), request)
+
+        expected, actual = model_path(), fast_path()
+        for want, got in zip(expected, actual):
+            if renderer.render(want) != renderer.render(got):
+                raise CommandError(f"Output differs for order #{want['id']}:\n{renderer.render(want)}\n{renderer.render(got)}")
+        if len(expected) != len(actual):
+            raise CommandError(f'Expected {len(expected)} orders, got {len(actual)}')
+        self.stdout.write(self.style.SUCCESS(f'Output identical for {len(ids)} orders'))
+
+        timings = {}
+        for name, serialize in (('OrderSerializer', model_path), ('values()', fast_path)):
+            best = float('inf')
+            for _ in range(options['repeat']):
+                start = time.perf_counter()
+                renderer.render(serialize())
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+            self.stdout.write(f'{name:>16}: {best * 1000:.1f} ms')
+        speedup = timings['OrderSerializer'] / timings['values()']
+        self.stdout.write(self.style.SUCCESS(f'values() path is {speedup:.1f}x faster'))
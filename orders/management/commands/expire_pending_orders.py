@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from orders.transitions import expire_pending, stale_pending_orders
+
+
+class Command(BaseCommand):
+    help = 'Cancel orders still pending PENDING_ORDER_EXPIRY minutes after they were placed (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.PENDING_ORDER_EXPIRY,
+                            help='Minutes an order may stay pending (default: PENDING_ORDER_EXPIRY)')
+        parser.add_argument('--batch-size', type=int, default=500, help='Orders canceled per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the orders that would be canceled')
+
+    def handle(self, *args, **options):
+        if options['older_than'] < 0 or options['batch_size'] < 1:
+            raise CommandError('--older-than must not be negative and --batch-size must be at least 1')
+        before = timezone.now() - timedelta(minutes=options['older_than'])
+
+        if options['dry_run']:
+            count = stale_pending_orders(before).count()
+            self.stdout.write(f'{count} orders pending since before {before:%Y-%m-%d %H:%M} would be canceled')
+            return
+
+        canceled = 0
+        for batch in expire_pending(before, options['batch_size']):
+            canceled += batch
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  canceled {batch}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Canceled {canceled} orders pending since before {before:%Y-%m-%d %H:%M}'
+        ))
@@ -0,0 +1,39 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.export import CHUNK_SIZE, filter_lines, iter_csv
+from orders.serializers import OrderExportFilterSerializer
+
+
+class Command(BaseCommand):
+    help = 'Write order lines as CSV, the same rows as GET /api/orders/export/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day, YYYY-MM-DD')
+        parser.add_argument('--to', dest='date_to', help='Last day, YYYY-MM-DD (inclusive)')
+        parser.add_argument('--status', help='Comma separated statuses')
+        parser.add_argument('--payment-method')
+        parser.add_argument('--output', default='-', help='Destination file, - writes stdout (default)')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per query round trip')
+
+    def handle(self, *args, **options):
+        filters = OrderExportFilterSerializer(data={
+            key: options[key] for key in ('date_from', 'date_to', 'status', 'payment_method')
+            if options[key] is not None
+        })
+        if not filters.is_valid():
+            raise CommandError('; '.join(
+                f"{field}: {' '.join(str(error) for error in errors)}" for field, errors in filters.errors.items()
+            ))
+        queryset = filter_lines(**filters.get_filters())
+
+        started = time.perf_counter()
+        if options['output'] == '-':
+            sys.stdout.writelines(iter_csv(queryset, options['chunk_size']))
+            return
+        with open(options['output'], 'w', newline='', encoding='utf-8') as f:
+            f.writelines(iter_csv(queryset, options['chunk_size']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {options['output']} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -0,0 +1,214 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import CustomUser
+from menu.cache import bump_menu_version
+from menu.models import Category, MenuItem, unique_category_slug
+from orders.models import Address, Order, OrderItem
+from orders.rollups import day_windows, rebuild, sales_day
+
+DEFAULT_STATUS_MIX = 'pending=5,preparing=3,shipped=2,completed=80,canceled=10'
+CITIES = ['Cairo', 'Giza', 'Alexandria', 'Mansoura', 'Tanta', 'Aswan', 'Luxor', 'Suez']
+WORDS = [
+    'spicy', 'grilled', 'crispy', 'cheese', 'chicken', 'beef', 'garlic', 'tomato',
+    'mushroom', 'pepper', 'basil', 'smoky', 'creamy', 'double', 'classic', 'veggie',
+]
+
+
+@contextmanager
+def explicit_timestamps(model, *field_names):
+    """Lets bulk_create keep the created_at/updated_at values we set"""
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def parse_status_mix(value):
+    valid = {key for key, _ in Order.STATUS_CHOICES}
+    mix = {}
+    for part in value.split(','):
+        status, _, weight = part.partition('=')
+        status = status.strip()
+        if status not in valid:
+            raise CommandError(f'Unknown status "{status}", expected one of {sorted(valid)}')
+        try:
+            mix[status] = float(weight)
+        except ValueError:
+            raise CommandError(f'Invalid weight for "{status}": {weight!r}')
+    if not sum(mix.values()) > 0:
+        raise CommandError('The status mix needs at least one positive weight')
+    return mix
+
+
+class Command(BaseCommand):
+    help = 'Generate a large synthetic dataset (users, addresses, menu, orders) for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--categories', type=int, default=10)
+        parser.add_argument('--menu-items', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--max-lines', type=int, default=5, help='Order lines per order, 1..N')
+        parser.add_argument('--status-mix', default=DEFAULT_STATUS_MIX,
+                            help=f'Relative weights per status (default: {DEFAULT_STATUS_MIX})')
+        parser.add_argument('--days', type=int, default=365, help='Spread orders over this many days')
+        parser.add_argument('--until', help='Last day of the spread, YYYY-MM-DD (default: today, required with --seed)')
+        parser.add_argument('--seed', type=int, help='Seed for a reproducible dataset, together with --until')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='loadtest', help='Prefix of generated user emails')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        status_mix = parse_status_mix(options['status_mix'])
+        if options['seed'] is not None and not options['until']:
+            # Anchored on today, the same seed would shift every timestamp daily
+            raise CommandError('--seed needs a fixed --until to be reproducible')
+        until = (datetime.strptime(options['until'], '%Y-%m-%d').date()
+                 if options['until'] else timezone.now().date())
+        end = timezone.make_aware(datetime.combine(until, dt_time.max), timezone.get_current_timezone())
+        # No orders from the future, whatever is left of today included
+        self.end = min(end, timezone.now())
+        self.spread = timedelta(days=options['days']).total_seconds()
+
+        if CustomUser.objects.filter(email__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users with the '{options['prefix']}-' prefix exist already, pass another --prefix")
+        category_names = [f"{options['prefix'].title()} Category {i}" for i in range(options['categories'])]
+        if Category.objects.filter(name__in=category_names).exists():
+            raise CommandError(f"Categories named '{category_names[0]}...' exist already, pass another --prefix")
+
+        started = time.perf_counter()
+        users = self.create_users(options['users'], options['prefix'])
+        addresses = self.create_addresses(users)
+        menu_items = self.create_menu(category_names, options['menu_items'])
+        if not users or not menu_items:
+            raise CommandError('Orders need at least one user and one menu item')
+        self.create_orders(options['orders'], options['max_lines'], status_mix, addresses, menu_items)
+        self.rebuild_rollups()
+        bump_menu_version()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated load data in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def progress(self, label, done, total, started):
+        rate = done / max(time.perf_counter() - started, 1e-9)
+        self.stdout.write(f'  {label}: {done}/{total} ({rate:,.0f}/s)')
+
+    def create_users(self, count, prefix):
+        # Hashing once keeps user creation from being dominated by PBKDF2
+        password = make_password('loadtest')
+        users = []
+        started = time.perf_counter()
+        for start in range(0, count, self.batch_size):
+            batch = [
+                CustomUser(email=f'{prefix}-{i}@example.com', password=password,
+                           first_name=f'Load{i}', last_name='Tester')
+                for i in range(start, min(start + self.batch_size, count))
+            ]
+            users.extend(CustomUser.objects.bulk_create(batch))
+            self.progress('users', len(users), count, started)
+        return users
+
+    def create_addresses(self, users):
+        """One to three addresses per user, the first one being the default"""
+        rng = self.rng
+        pending, addresses = [], {}
+        for user in users:
+            for n in range(rng.randint(1, 3)):
+                pending.append(Address(
+                    user=user, street_address=f'{rng.randint(1, 300)} {rng.choice(WORDS).title()} St',
+                    apartment=f'Floor {rng.randint(1, 20)}' if rng.random() < 0.6 else None,
+                    city=rng.choice(CITIES), phone=f'01{rng.randint(0, 999999999):09d}', default=n == 0,
+                ))
+        started = time.perf_counter()
+        for start in range(0, len(pending), self.batch_size):
+            for address in Address.objects.bulk_create(pending[start:start + self.batch_size]):
+                addresses.setdefault(address.user_id, []).append(address.pk)
+            self.progress('addresses', min(start + self.batch_size, len(pending)), len(pending), started)
+        return addresses
+
+    def create_menu(self, category_names, item_count):
+        rng = self.rng
+        # bulk_create() skips Category.save(), which keeps slugs unique
+        taken = set(Category.objects.values_list('slug', flat=True))
+        categories = []
+        for name in category_names:
+            categories.append(Category(name=name, slug=unique_category_slug(name, taken)))
+            taken.add(categories[-1].slug)
+        categories = Category.objects.bulk_create(categories) or list(Category.objects.all())
+        if item_count and not categories:
+            raise CommandError('Menu items need at least one category')
+        MenuItem.objects.bulk_create([
+            MenuItem(
+                name=' '.join(rng.sample(WORDS, 2)).title() + f' #{i}',
+                description=' '.join(rng.choices(WORDS, k=12)).capitalize() + '.',
+                price=Decimal(rng.randrange(5000, 30000, 50)) / 100,
+                category=rng.choice(categories), image='',
+            )
+            for i in range(item_count)
+        ], batch_size=self.batch_size)
+        self.stdout.write(f'  menu: {len(category_names)} categories, {item_count} items')
+        return list(MenuItem.objects.order_by('pk').values_list('pk', 'price'))
+
+    def create_orders(self, count, max_lines, status_mix, addresses, menu_items):
+        rng = self.rng
+        statuses, weights = list(status_mix), list(status_mix.values())
+        user_ids = list(addresses)
+        payment_methods = [key for key, _ in Order.PAYMENT_METHODS]
+        done, lines = 0, 0
+        started = time.perf_counter()
+
+        with explicit_timestamps(Order, 'created_at', 'updated_at'):
+            while done < count:
+                size = min(self.batch_size, count - done)
+                orders, order_lines = [], []
+                for status in rng.choices(statuses, weights, k=size):
+                    user_id = rng.choice(user_ids)
+                    created_at = self.end - timedelta(seconds=rng.random() * self.spread)
+                    updated_at = created_at if status == 'pending' else created_at + timedelta(minutes=rng.randint(5, 120))
+                    picked = rng.sample(menu_items, min(rng.randint(1, max_lines), len(menu_items)))
+                    quantities = [rng.randint(1, 4) for _ in picked]
+                    orders.append(Order(
+                        user_id=user_id, address_id=rng.choice(addresses[user_id]),
+                        created_at=created_at, updated_at=updated_at,
+                        payment_method=rng.choice(payment_methods), status=status,
+                        total=sum((price * quantity for (_, price), quantity in zip(picked, quantities)), Decimal('0.00')),
+                        canceled_at=updated_at if status == 'canceled' else None,
+                        is_active=status != 'canceled',
+                    ))
+                    order_lines.append(list(zip(picked, quantities)))
+
+                with transaction.atomic():
+                    Order.objects.bulk_create(orders)
+                    items = [
+                        OrderItem(order_id=order.pk, item_id=item_id, price=price, quantity=quantity)
+                        for order, picked in zip(orders, order_lines)
+                        for (item_id, price), quantity in picked
+                    ]
+                    OrderItem.objects.bulk_create(items)
+                done += size
+                lines += len(items)
+                if done == count or done % (self.batch_size * 10) == 0:
+                    self.progress('orders', done, count, started)
+        self.stdout.write(f'  order items: {lines}')
+
+    def rebuild_rollups(self):
+        # bulk_create() bypasses the incremental rollup updates
+        first = sales_day(self.end - timedelta(seconds=self.spread))
+        for window in day_windows(first, sales_day(self.end), 31):
+            rebuild(*window)
+        self.stdout.write('  sales rollups rebuilt')
@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from orders.idempotency import purge_expired_keys
+
+class Command(BaseCommand):
+    help = 'Delete all idempotency keys older than IDEMPOTENCY_KEY_TTL (order placement also sweeps them)'
+
+    def handle(self, *args, **kwargs):
+        deleted = purge_expired_keys()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys'))
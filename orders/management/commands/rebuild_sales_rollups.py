@@ -0,0 +1,60 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.rollups import compare, date_span, day_windows, rebuild
+
+
+def parse_day(value, option):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'{option} expects YYYY-MM-DD, got {value!r}')
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from the orders, a few days per transaction, or check them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='First day, YYYY-MM-DD (default: the first order)')
+        parser.add_argument('--to', dest='date_to', help='Last day, YYYY-MM-DD (default: the last order)')
+        parser.add_argument('--batch-days', type=int, default=7, help='Days recomputed per transaction')
+        parser.add_argument('--check', action='store_true',
+                            help='Only compare the rollups with the orders and fail on any difference')
+        parser.add_argument('--show', type=int, default=20, help='Differences listed by --check')
+
+    def handle(self, *args, **options):
+        if options['batch_days'] < 1:
+            raise CommandError('--batch-days must be at least 1')
+        span = date_span()
+        first = parse_day(options['date_from'], '--from') if options['date_from'] else span and span[0]
+        last = parse_day(options['date_to'], '--to') if options['date_to'] else span and span[1]
+        if first is None or last is None:
+            self.stdout.write('No orders or rollups, nothing to do')
+            return
+        if first > last:
+            raise CommandError('--from must not be after --to')
+
+        started = time.perf_counter()
+        drift, days, items = [], 0, 0
+        for window in day_windows(first, last, options['batch_days']):
+            if options['check']:
+                drift.extend(compare(*window))
+            else:
+                written = rebuild(*window)
+                days += written[0]
+                items += written[1]
+            if options['verbosity'] > 1:
+                self.stdout.write(f'  {window[0]} .. {window[1]}')
+        elapsed = time.perf_counter() - started
+
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {first} .. {last} in {elapsed:.1f}s: {days} daily rows, {items} item rows'
+            ))
+            return
+        if drift:
+            for table, key, stored, expected in drift[:options['show']]:
+                self.stdout.write(f'  {table} {key}: stored {stored}, expected {expected}')
+            raise CommandError(f'{len(drift)} rollup rows differ from the orders between {first} and {last}')
+        self.stdout.write(self.style.SUCCESS(f'Rollups match the orders from {first} to {last} ({elapsed:.1f}s)'))
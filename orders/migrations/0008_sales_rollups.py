@@ -0,0 +1,78 @@
+# Generated by Django 5.2 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def fill_rollups(apps, schema_editor):
+    """Counts the orders placed before the rollups existed, as orders.rollups.rebuild() would"""
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('orders', 'DailySales')
+    DailyItemSales = apps.get_model('orders', 'DailyItemSales')
+    db = schema_editor.connection.alias
+    tz = timezone.get_default_timezone()
+
+    days = Order.objects.using(db).order_by().values('status', day=TruncDate('created_at', tzinfo=tz)).annotate(
+        count=Count('id'), revenue=Sum('total')
+    )
+    DailySales.objects.using(db).bulk_create((
+        DailySales(day=row['day'], status=row['status'], orders=row['count'], revenue=row['revenue'])
+        for row in days.iterator()
+    ), batch_size=1000)
+    items = OrderItem.objects.using(db).order_by().values(
+        'item_id', status=F('order__status'), day=TruncDate('order__created_at', tzinfo=tz)
+    ).annotate(
+        units=Sum('quantity'),
+        revenue=Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+    )
+    DailyItemSales.objects.using(db).bulk_create((
+        DailyItemSales(day=row['day'], status=row['status'], item_id=row['item_id'],
+                       quantity=row['units'], revenue=row['revenue'])
+        for row in items.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0004_category_slug'),
+        ('orders', '0007_order_status_created_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('preparing', 'Preparing'), ('shipped', 'Shipped'), ('completed', 'Completed'), ('canceled', 'Canceled')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='dailysales_day_status_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('preparing', 'Preparing'), ('shipped', 'Shipped'), ('completed', 'Completed'), ('canceled', 'Canceled')], max_length=20)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='menu.menuitem')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily item sales',
+                'constraints': [models.UniqueConstraint(fields=('day', 'status', 'item'), name='dailyitemsales_day_status_item_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
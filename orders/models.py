@@ -1,10 +1,55 @@
-from django.db import models
+from django.db import DatabaseError, models, transaction
 from django.utils import timezone
 from decimal import Decimal
+from rest_framework.utils.encoders import JSONEncoder
 from accounts.models import CustomUser
 from menu.models import MenuItem
 
-class Address(models.Model):
+class VersionConflict(DatabaseError):
+    """save() of a row whose version moved on since it was read"""
+
+
+class Versioned(models.Model):
+    """
+    ``version`` grows by one with every saved change. ETags carry it and
+    conditional writes compare and bump it (tastybites_api.mixins.VersionedWriteMixin).
+
+    save() of an existing row is a compare-and-set: its UPDATE only matches
+    the version this instance was read at, so of two saves from the same
+    read the second raises VersionConflict instead of overwriting the first.
+    Like any failed save(), that breaks an enclosing transaction unless the
+    save() runs in its own atomic() block.
+    """
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+        self._saved_version = self.version
+        self.version += 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        try:
+            super().save(*args, **kwargs)
+        except BaseException:
+            self.version = self._saved_version
+            raise
+        finally:
+            del self._saved_version
+
+    def _do_update(self, base_qs, using, pk_val, *args, **kwargs):
+        if not hasattr(self, '_saved_version'):
+            return super()._do_update(base_qs, using, pk_val, *args, **kwargs)
+        if super()._do_update(base_qs.filter(version=self._saved_version), using, pk_val, *args, **kwargs):
+            return True
+        if base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(f'{self._meta.label} {pk_val} is no longer at version {self._saved_version}')
+        return False  # deleted meanwhile, save() handles that as it always does
+
+class Address(Versioned):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     street_address = models.CharField(max_length=255)
     apartment = models.CharField(
@@ -35,7 +80,16 @@ class Address(models.Model):
         ]
         return '\n'.join(filter(None, parts))
 
-class Order(models.Model):
+def build_transitions(statuses):
+    """Each status may move on to the next one in ``statuses``; only pending orders can be canceled"""
+    flow = [status for status in statuses if status != 'canceled']
+    transitions = {status: set() for status in statuses}
+    for current, following in zip(flow, flow[1:]):
+        transitions[current].add(following)
+    transitions['pending'].add('canceled')
+    return transitions
+
+class Order(Versioned):
     PAYMENT_METHODS = [
         ('bank', 'Bank Transfer'),
         ('cash', 'Cash on Delivery'),
@@ -48,6 +102,7 @@ class Order(models.Model):
         ('completed', 'Completed'),
         ('canceled', 'Canceled'),
     ]
+    TRANSITIONS = build_transitions([key for key, _ in STATUS_CHOICES])
     
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     address = models.ForeignKey(Address, on_delete=models.SET_NULL, null=True)
@@ -66,6 +121,14 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'status', 'created_at'], name='order_user_status_created_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_idx'),
+            # Date range reads across all users (CSV export)
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            # Status filtered lists across all users, newest first (admin)
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ]
         permissions = [
             ("cancel_order", "Can cancel order"),
             ("change_status", "Can change order status"),
@@ -96,14 +159,33 @@ class Order(models.Model):
         return self.total
     
     def cancel(self, save=True):
-        if self.status == 'pending':
-            self.status = 'canceled'
-            self.is_active = False
-            self.canceled_at = timezone.now()
-            if save:
-                self.save()
+        """
+        Cancels a pending order; returns whether this call canceled it. With
+        ``save`` that is one UPDATE of the cancel columns conditional on the
+        order still being pending, so a concurrent status change is never
+        overwritten (this instance is then left as it was).
+        """
+        if self.status != 'pending':
+            return False
+        from .transitions import transition_fields
+        fields = transition_fields('canceled', timezone.now())
+        if save:
+            from .events import status_changed
+            from .rollups import move_order
+            with transaction.atomic():
+                if not Order.objects.filter(pk=self.pk, status='pending').update(
+                    **fields, version=models.F('version') + 1
+                ):
+                    return False
+                for name, value in fields.items():
+                    setattr(self, name, value)
+                self.version += 1
+                move_order(self, 'pending')  # uses the prefetched items, if any
+                status_changed(self, 'pending')
             return True
-        return False
+        for name, value in fields.items():
+            setattr(self, name, value)
+        return True
     
     def get_absolute_url(self):
         from django.urls import reverse
@@ -125,4 +207,54 @@ class OrderItem(models.Model):
     
     @property
     def subtotal(self):
-        return Decimal(str(self.price)) * Decimal(str(self.quantity))
\ No newline at end of file
+        return Decimal(str(self.price)) * Decimal(str(self.quantity))
+
+class IdempotencyKey(models.Model):
+    """Response of an order placement, replayed for retries with the same key"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    response_body = models.JSONField(encoder=JSONEncoder)  # encodes like the API renderer
+    status_code = models.PositiveSmallIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_user_idempotency_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.user_id})"
+
+class DailySales(models.Model):
+    """Orders placed on a day (settings.TIME_ZONE) by current status, see orders.rollups"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='dailysales_day_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.orders} orders, {self.revenue}"
+
+class DailyItemSales(models.Model):
+    """Menu item quantity and revenue per day and current order status"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+
+    class Meta:
+        verbose_name_plural = "Daily item sales"
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status', 'item'], name='dailyitemsales_day_status_item_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status} item {self.item_id}: {self.quantity}x, {self.revenue}"
@@ -0,0 +1,261 @@
+"""
+Daily sales rollups, kept current as orders are placed and change status.
+
+``DailySales`` counts the orders and revenue placed per day (in
+settings.TIME_ZONE) and current status, ``DailyItemSales`` the quantity
+and revenue per day, status and menu item. Every change adds its deltas
+inside its own transaction with one INSERT ... ON CONFLICT DO UPDATE per
+table, so reports read the rollups and never the orders.
+
+Writes that go around these functions (bulk_create(), queryset.update(),
+raw SQL) must rebuild() the days they touch; ``rebuild_sales_rollups
+--check`` finds any drift.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyItemSales, DailySales, Order, OrderItem
+
+CENT = Decimal('0.01')
+LINE_REVENUE = Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+# Report dimension -> rollup columns, see report()
+GROUPS = {
+    'day': ('day',),
+    'item': ('item_id', 'item__name'),
+    'category': ('item__category_id', 'item__category__name'),
+}
+COLUMN_NAMES = {'item__name': 'item_name', 'item__category_id': 'category_id', 'item__category__name': 'category_name'}
+
+
+def sales_day(moment):
+    return timezone.localtime(moment, timezone.get_default_timezone()).date()
+
+
+def day_bounds(first, last):
+    """``[start, end)`` datetimes covering the days first..last"""
+    tz = timezone.get_default_timezone()
+    return datetime.combine(first, time.min, tz), datetime.combine(last + timedelta(days=1), time.min, tz)
+
+
+def day_windows(first, last, size):
+    """``(first, last)`` day ranges of ``size`` days covering first..last"""
+    while first <= last:
+        yield first, min(first + timedelta(days=size - 1), last)
+        first += timedelta(days=size)
+
+
+def add_rows(model, key_fields, value_fields, rows):
+    """
+    Adds ``rows`` ({key tuple: value tuple}) to the rows with the same key,
+    creating the missing ones, in one statement per batch.
+    """
+    rows = [(key, values) for key, values in rows.items() if any(values)]
+    if not rows:
+        return
+    fields = [model._meta.get_field(name) for name in (*key_fields, *value_fields)]
+    if not connection.features.supports_update_conflicts_with_target:
+        for key, values in rows:
+            lookup = dict(zip(key_fields, key))
+            increments = {name: F(name) + value for name, value in zip(value_fields, values)}
+            if not model.objects.filter(**lookup).update(**increments):
+                model.objects.create(**lookup, **dict(zip(value_fields, values)))
+        return
+
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    keys, values = fields[:len(key_fields)], fields[len(key_fields):]
+    increments = ', '.join(
+        f'{quote(field.column)} = {table}.{quote(field.column)} + EXCLUDED.{quote(field.column)}' for field in values
+    )
+    batch_size = connection.ops.bulk_batch_size(fields, rows)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            placeholders = ', '.join(['({})'.format(', '.join(['%s'] * len(fields)))] * len(batch))
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) VALUES {placeholders} "
+                f"ON CONFLICT ({', '.join(quote(field.column) for field in keys)}) DO UPDATE SET {increments}",
+                [field.get_db_prep_value(value, connection)
+                 for key, row in batch for field, value in zip(fields, (*key, *row))]
+            )
+
+
+class Deltas:
+    """Changes to both rollup tables, written by save()"""
+
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, Decimal('0.00')])  # (day, status) -> [orders, revenue]
+        self.items = defaultdict(lambda: [0, Decimal('0.00')])  # (day, status, item id) -> [quantity, revenue]
+
+    def add_orders(self, day, status, count, revenue, sign=1):
+        entry = self.days[day, status]
+        entry[0] += sign * count
+        entry[1] += sign * revenue
+
+    def add_item(self, day, status, item_id, quantity, revenue, sign=1):
+        entry = self.items[day, status, item_id]
+        entry[0] += sign * quantity
+        entry[1] += sign * revenue
+
+    def add_order(self, order, lines, status, sign=1):
+        day = sales_day(order.created_at)
+        self.add_orders(day, status, 1, order.total, sign)
+        for line in lines:
+            self.add_item(day, status, line.item_id, line.quantity, line.subtotal, sign)
+
+    def save(self):
+        add_rows(DailySales, ('day', 'status'), ('orders', 'revenue'), self.days)
+        add_rows(DailyItemSales, ('day', 'status', 'item'), ('quantity', 'revenue'), self.items)
+
+
+def record_order(order, lines):
+    """Counts a newly placed order with its lines"""
+    deltas = Deltas()
+    deltas.add_order(order, lines, order.status)
+    deltas.save()
+
+
+def move_order(order, old_status):
+    """Moves an order counted under ``old_status`` to its current status (uses prefetched items)"""
+    if old_status == order.status:
+        return
+    lines = order.items.all()
+    deltas = Deltas()
+    deltas.add_order(order, lines, old_status, sign=-1)
+    deltas.add_order(order, lines, order.status)
+    deltas.save()
+
+
+def move_orders(queryset, status=None):
+    """
+    Moves the orders in ``queryset`` to ``status``, or uncounts them when it
+    is None, aggregating in the database. Run it in the transaction of the
+    UPDATE or DELETE, before it: it reads each order's current status.
+    """
+    tz = timezone.get_default_timezone()
+    queryset = queryset.order_by()
+    deltas = Deltas()
+    orders = queryset.values('status', day=TruncDate('created_at', tzinfo=tz)).annotate(
+        count=Count('id'), revenue=Sum('total')
+    )
+    for row in orders:
+        if row['status'] != status:
+            deltas.add_orders(row['day'], row['status'], row['count'], row['revenue'], sign=-1)
+            if status is not None:
+                deltas.add_orders(row['day'], status, row['count'], row['revenue'])
+    lines = OrderItem.objects.filter(order__in=queryset.values('pk')).order_by().values(
+        'item_id', old_status=F('order__status'), day=TruncDate('order__created_at', tzinfo=tz)
+    ).annotate(units=Sum('quantity'), revenue=LINE_REVENUE)
+    for row in lines:
+        if row['old_status'] != status:
+            deltas.add_item(row['day'], row['old_status'], row['item_id'], row['units'], row['revenue'], sign=-1)
+            if status is not None:
+                deltas.add_item(row['day'], status, row['item_id'], row['units'], row['revenue'])
+    deltas.save()
+
+
+def expected_rows(first, last):
+    """The rollup rows of days first..last computed from the orders"""
+    start, end = day_bounds(first, last)
+    tz = timezone.get_default_timezone()
+    orders = Order.objects.filter(created_at__gte=start, created_at__lt=end).order_by().values(
+        'status', day=TruncDate('created_at', tzinfo=tz)
+    ).annotate(count=Count('id'), revenue=Sum('total'))
+    lines = OrderItem.objects.filter(order__created_at__gte=start, order__created_at__lt=end).order_by().values(
+        'item_id', status=F('order__status'), day=TruncDate('order__created_at', tzinfo=tz)
+    ).annotate(units=Sum('quantity'), revenue=LINE_REVENUE)
+    return (
+        {(row['day'], row['status']): (row['count'], row['revenue']) for row in orders},
+        {(row['day'], row['status'], row['item_id']): (row['units'], row['revenue']) for row in lines},
+    )
+
+
+def stored_rows(first, last):
+    days = DailySales.objects.filter(day__range=(first, last)).values_list('day', 'status', 'orders', 'revenue')
+    items = DailyItemSales.objects.filter(day__range=(first, last)).values_list(
+        'day', 'status', 'item_id', 'quantity', 'revenue'
+    )
+    # Rows that went back to zero are as good as missing
+    return (
+        {(day, status): (count, revenue) for day, status, count, revenue in days if count or revenue},
+        {(day, status, item): (units, revenue) for day, status, item, units, revenue in items if units or revenue},
+    )
+
+
+def rebuild(first, last):
+    """Recomputes the days first..last from the orders; returns the rows written per table"""
+    days, items = expected_rows(first, last)
+    with transaction.atomic():
+        DailySales.objects.filter(day__range=(first, last)).delete()
+        DailyItemSales.objects.filter(day__range=(first, last)).delete()
+        DailySales.objects.bulk_create(
+            DailySales(day=day, status=status, orders=count, revenue=revenue)
+            for (day, status), (count, revenue) in days.items()
+        )
+        DailyItemSales.objects.bulk_create(
+            DailyItemSales(day=day, status=status, item_id=item_id, quantity=units, revenue=revenue)
+            for (day, status, item_id), (units, revenue) in items.items()
+        )
+    return len(days), len(items)
+
+
+def rebuild_order_days(*orders):
+    """rebuild() for the days of orders edited in ways the deltas do not follow (admin)"""
+    for day in sorted({sales_day(order.created_at) for order in orders}):
+        rebuild(day, day)
+
+
+def compare(first, last):
+    """``(table, key, stored, expected)`` for every row of days first..last that is off"""
+    stored, expected = stored_rows(first, last), expected_rows(first, last)
+    drift = []
+    for table, have, want in zip(('daily_sales', 'daily_item_sales'), stored, expected):
+        for key in sorted(have.keys() | want.keys(), key=str):
+            if have.get(key) != want.get(key):
+                drift.append((table, key, have.get(key), want.get(key)))
+    return drift
+
+
+def date_span():
+    """First and last day holding orders or rollups, or None"""
+    ends = []
+    for queryset, field in ((Order.objects, 'created_at'), (DailySales.objects, 'day')):
+        # Two ordered single-row reads, each answered from an index
+        first = queryset.order_by(field).values_list(field, flat=True).first()
+        if first is not None:
+            ends.append((first, queryset.order_by(f'-{field}').values_list(field, flat=True).first()))
+    days = [sales_day(value) if isinstance(value, datetime) else value for pair in ends for value in pair]
+    return (min(days), max(days)) if days else None
+
+
+def money(value):
+    """Decimal string, as the API renders DecimalFields"""
+    return str(value.quantize(CENT))
+
+
+def report(date_from, date_to, statuses, group_by):
+    """Figures per ``group_by`` dimensions (see GROUPS) over the rollups only"""
+    if list(group_by) == ['day']:
+        rows = DailySales.objects.filter(day__range=(date_from, date_to), status__in=statuses).values(
+            'day'
+        ).annotate(count=Sum('orders'), sales=Sum('revenue')).order_by('day')
+        return [{'day': row['day'], 'orders': row['count'], 'revenue': money(row['sales'])} for row in rows]
+
+    columns = [column for group in GROUPS if group in group_by for column in GROUPS[group]]
+    rows = DailyItemSales.objects.filter(day__range=(date_from, date_to), status__in=statuses).values(
+        *columns
+    ).annotate(units=Sum('quantity'), sales=Sum('revenue')).order_by(
+        *(['day'] if 'day' in group_by else []), '-sales', *columns
+    )
+    return [
+        {**{COLUMN_NAMES.get(column, column): row[column] for column in columns},
+         'quantity': row['units'], 'revenue': money(row['sales'])}
+        for row in rows
+    ]
@@ -1,12 +1,21 @@
+from datetime import date, timedelta
+
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Address, Order, OrderItem, Address
 from menu.serializers import MenuItemSerializer
 from menu.models import MenuItem
 from decimal import Decimal
+from tastybites_api.query_budget import QueryBudgetSerializerMixin
+from .events import order_created, status_changed
+from .rollups import GROUPS, move_order, record_order, sales_day
+from .transitions import transition_fields
 
 ### ----- Address Serializer -----
-class AddressSerializer(serializers.ModelSerializer):
+class AddressSerializer(QueryBudgetSerializerMixin, serializers.ModelSerializer):
     full_address = serializers.SerializerMethodField()
+    query_budget = 1
 
     class Meta:
         model = Address
@@ -46,13 +55,40 @@ class OrderStatusSerializer(serializers.ModelSerializer):
         fields = ('id', 'status')
         read_only_fields = ('id',)
 
+    def validate_status(self, value):
+        current = self.instance.status if self.instance is not None else None
+        if current is not None and value != current and value not in Order.TRANSITIONS[current]:
+            raise serializers.ValidationError(f'Cannot move a {current} order to {value}.')
+        return value
+
+    def update(self, instance, validated_data):
+        old_status = instance.status
+        if validated_data.get('status', old_status) != old_status:
+            validated_data.update(transition_fields(validated_data['status'], timezone.now()))
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            move_order(instance, old_status)
+            status_changed(instance, old_status)
+        return instance
+
+
+class OrderBatchStatusSerializer(serializers.Serializer):
+    MAX_ORDERS = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_ORDERS
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
 
 ### ----- Full Order Serializer (for retrieval) -----
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(QueryBudgetSerializerMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     address = AddressSerializer()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     can_cancel = serializers.SerializerMethodField()
+    # orders plus one prefetch of items with menu items and categories
+    query_budget = 2
 
     class Meta:
         model = Order
@@ -69,8 +105,24 @@ class OrderSerializer(serializers.ModelSerializer):
         return obj.status == 'pending'
 
 
+### ----- Order Update Serializer (customer edits, PUT/PATCH) -----
+class OrderUpdateSerializer(serializers.ModelSerializer):
+    """The fields a customer may change; status moves through its own endpoints"""
+
+    class Meta:
+        model = Order
+        fields = ('address', 'payment_method', 'special_notes')
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['address'].queryset = Address.objects.filter(user=self.context['request'].user)
+        return fields
+
+
 ### ----- Create-Only OrderItem (flat input, not nested) -----
 class CreateOrderItemSerializer(serializers.ModelSerializer):
+    # Plain ids; CreateOrderSerializer resolves every line in one query
+    item = serializers.IntegerField()
 
     class Meta:
         model = OrderItem
@@ -86,29 +138,112 @@ class CreateOrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('address', 'payment_method', 'items', 'special_notes')
 
+    def validate_items(self, items):
+        """Swaps menu item ids for instances, fetched with a single query"""
+        menu_items = MenuItem.objects.select_related('category').in_bulk(
+            {item_data['item'] for item_data in items}
+        )
+        message = serializers.PrimaryKeyRelatedField.default_error_messages['does_not_exist']
+        errors = [
+            {} if item_data['item'] in menu_items
+            else {'item': [message.format(pk_value=item_data['item'])]}
+            for item_data in items
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
+
+        for item_data in items:
+            item_data['item'] = menu_items[item_data['item']]
+        return items
+
     def create(self, validated_data):
         items_data = validated_data.pop('items')
 
-        # 1) INSERT the Order (total starts at zero)
-        order = Order.objects.create(
-            user=self.context['request'].user,
-            **validated_data,
-            status='pending',
-            total=Decimal('0.00')
-        )
-
-        # 2) INSERT all OrderItems
-        for item_data in items_data:
-            OrderItem.objects.create(
-                order=order,
+        # 1) Build the lines and total in memory from the validated menu items
+        order_items = [
+            OrderItem(
                 item=item_data['item'],
                 quantity=item_data['quantity'],
                 price=item_data['item'].price,
                 special_instructions=item_data.get('special_instructions', '')
             )
+            for item_data in items_data
+        ]
+        total = sum((line.subtotal for line in order_items), Decimal('0.00'))
+
+        with transaction.atomic():
+            # 2) INSERT the Order with its final total
+            order = Order.objects.create(
+                user=self.context['request'].user,
+                **validated_data,
+                status='pending',
+                total=total
+            )
+
+            # 3) INSERT all OrderItems in one statement
+            for line in order_items:
+                line.order = order
+            OrderItem.objects.bulk_create(order_items)
 
-        # 3) calculate_total (uses self.pk guard) and then do an UPDATE
-        order.total = order.calculate_total()
-        order.save(update_fields=['total'])
+            # 4) Count it in the daily sales rollups and tell the kitchen board
+            record_order(order, order_items)
+            order_created(order, order_items)
 
         return order
+
+
+### ----- Order Filters (query parameters / command options) -----
+class OrderRangeFilterSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    status = serializers.CharField(required=False, help_text='Comma separated statuses')
+
+    def validate_status(self, value):
+        statuses = [status.strip() for status in value.split(',') if status.strip()]
+        valid = dict(Order.STATUS_CHOICES)
+        unknown = [status for status in statuses if status not in valid]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown status: {', '.join(unknown)}")
+        return statuses
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({'date_to': 'Must not be before date_from.'})
+        return attrs
+
+
+class OrderExportFilterSerializer(OrderRangeFilterSerializer):
+    payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHODS, required=False)
+
+    def get_filters(self):
+        """Keyword arguments for orders.export.filter_lines"""
+        data = self.validated_data
+        return {
+            'date_from': data.get('date_from'), 'date_to': data.get('date_to'),
+            'statuses': data.get('status'), 'payment_method': data.get('payment_method'),
+        }
+
+
+class SalesReportFilterSerializer(OrderRangeFilterSerializer):
+    DEFAULT_DAYS = 30
+
+    group_by = serializers.CharField(
+        required=False, default='day', help_text=f"Comma separated: {', '.join(GROUPS)}"
+    )
+
+    def validate_group_by(self, value):
+        groups = list(dict.fromkeys(group.strip() for group in value.split(',') if group.strip()))
+        unknown = [group for group in groups if group not in GROUPS]
+        if unknown or not groups:
+            raise serializers.ValidationError(f"Expected some of: {', '.join(GROUPS)}")
+        return groups
+
+    def get_filters(self):
+        """Keyword arguments for orders.rollups.report; the last 30 days of placed, non-canceled orders by default"""
+        data = self.validated_data
+        date_to = data.get('date_to') or max(sales_day(timezone.now()), data.get('date_from') or date.min)
+        statuses = data.get('status') or [key for key, _ in Order.STATUS_CHOICES if key != 'canceled']
+        return {
+            'date_from': data.get('date_from') or date_to - timedelta(days=self.DEFAULT_DAYS - 1),
+            'date_to': date_to, 'statuses': statuses, 'group_by': data['group_by'],
+        }
@@ -0,0 +1,47 @@
+import threading
+
+from django.db.models import QuerySet
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from accounts.models import CustomUser
+from .models import Order
+from .rollups import move_orders
+
+# Orders of the delete() in progress already taken out of the rollups
+_uncounted = threading.local()
+
+
+def orders_deleted_by(origin):
+    """The orders a delete() of ``origin`` removes, None when it cannot tell"""
+    if isinstance(origin, QuerySet):
+        if origin.model is Order:
+            return Order.objects.filter(pk__in=origin.values('pk'))
+        if origin.model is CustomUser:
+            return Order.objects.filter(user__in=origin.values('pk'))
+    elif isinstance(origin, CustomUser):
+        return Order.objects.filter(user=origin)
+    return None
+
+
+@receiver(pre_delete, sender=Order)
+def uncount_deleted_order(sender, instance, origin=None, **kwargs):
+    """
+    Takes a deleted order (directly or with its user) out of the sales
+    rollups while its lines still exist. delete() sends every pre_delete
+    before removing any row, so the first order of a bulk or cascading
+    delete uncounts all of them in one pass and the others are skipped.
+    """
+    pending = getattr(_uncounted, 'orders', None)
+    if pending is not None and pending[0] is origin and instance.pk in pending[1]:
+        pending[1].discard(instance.pk)
+        return
+
+    queryset = orders_deleted_by(origin)
+    pks = set() if queryset is None else set(queryset.values_list('pk', flat=True))
+    if instance.pk not in pks:
+        move_orders(Order.objects.filter(pk=instance.pk))
+        return
+    move_orders(queryset)
+    pks.discard(instance.pk)
+    _uncounted.orders = (origin, pks) if pks else None
@@ -1,3 +1,671 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.test import APITestCase
+
+from accounts.models import CustomUser
+from menu.models import Category, MenuItem
+from tastybites_api.query_budget import QueryBudgetExceeded
+from .models import Address, DailyItemSales, DailySales, IdempotencyKey, Order, OrderItem, VersionConflict
+from .events import OrderEventBroker, broker
+from .rollups import compare, move_orders, rebuild, sales_day
+from .serializers import OrderSerializer
+from .views import OrderDetailView
+from .transitions import INVALID, NOT_FOUND, UNCHANGED, UPDATED, TransitionConflict, expire_pending, transition
+
+
+class OrderQueryBudgetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        pizza = Category.objects.create(name='Pizza')
+        desserts = Category.objects.create(name='Desserts')
+        items = [
+            MenuItem.objects.create(category=pizza, name='Margherita', description='Classic', price='9.50'),
+            MenuItem.objects.create(category=desserts, name='Tiramisu', description='Espresso', price='6.00'),
+        ]
+        for _ in range(3):
+            order = Order.objects.create(user=self.user, address=address, payment_method='cash', total='15.50')
+            for item in items:
+                OrderItem.objects.create(order=order, item=item, price=item.price)
+        self.order = order
+        self.client.force_authenticate(self.user)
+
+    def test_list_does_not_grow_with_the_orders(self):
+        # Validators aggregate, orders, lines with their items and categories
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order_list'))
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['items'][1]['item']['category']['name'], 'Desserts')
+
+    def test_detail(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('order_detail', args=[self.order.pk]))
+        self.assertEqual(len(response.data['items']), 2)
+
+
+class QueryBudgetEnforcementTests(TestCase):
+    def test_overrun_fails_the_test_run(self):
+        order = Order.objects.create(
+            user=CustomUser.objects.create_user('diner@example.com', 'pw'), payment_method='cash'
+        )
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        OrderItem.objects.create(order=order, item=item, price=item.price)
+        # Without ORDER_ITEMS_PREFETCH the nested item and category are one query each
+        with self.assertRaises(QueryBudgetExceeded):
+            OrderSerializer(order).data
+
+
+class OrderConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.order = Order.objects.create(user=self.user, payment_method='cash', total='9.50')
+        self.client.force_authenticate(self.user)
+
+    def test_list_not_modified(self):
+        response = self.client.get(reverse('order_list'))
+        # Only the validators' aggregate is read
+        with self.assertNumQueries(1):
+            revalidated = self.client.get(reverse('order_list'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        revalidated = self.client.get(reverse('order_list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_new_order_changes_the_list_etag(self):
+        etag = self.client.get(reverse('order_list'))['ETag']
+        Order.objects.create(user=self.user, payment_method='bank', total='6.00')
+        self.assertEqual(self.client.get(reverse('order_list'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_not_modified(self):
+        url = reverse('order_detail', args=[self.order.pk])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_edit_after_if_modified_since(self):
+        url = reverse('order_detail', args=[self.order.pk])
+        since = http_date(self.order.updated_at.timestamp() - 60)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+
+class OrderPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.orders = [Order.objects.create(user=self.user, payment_method='cash') for _ in range(5)]
+        self.client.force_authenticate(self.user)
+
+    def test_pages_newest_first(self):
+        first = self.client.get(reverse('order_list'), {'page_size': 3}).data
+        self.assertEqual([order['id'] for order in first['results']], [order.pk for order in self.orders[:1:-1]])
+        second = self.client.get(first['next']).data
+        self.assertEqual([order['id'] for order in second['results']], [order.pk for order in self.orders[1::-1]])
+        self.assertIsNone(second['next'])
+
+    def test_new_orders_do_not_shift_the_next_page(self):
+        first = self.client.get(reverse('order_list'), {'page_size': 3}).data
+        Order.objects.create(user=self.user, payment_method='cash')
+        second = self.client.get(first['next']).data
+        self.assertEqual([order['id'] for order in second['results']], [order.pk for order in self.orders[1::-1]])
+
+
+class OrderCreateTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        pizza = Category.objects.create(name='Pizza')
+        self.margherita = MenuItem.objects.create(category=pizza, name='Margherita', description='Classic', price='9.50')
+        self.diavola = MenuItem.objects.create(category=pizza, name='Diavola', description='Spicy', price='11.00')
+        self.client.force_authenticate(self.user)
+
+    def test_create(self):
+        data = {
+            'address': self.address.pk, 'payment_method': 'cash', 'special_notes': 'Ring twice',
+            'items': [{'item': self.margherita.pk, 'quantity': 2}, {'item': self.diavola.pk, 'quantity': 1}],
+        }
+        # Address, menu items, order, lines, two rollup upserts, the lines
+        # for the response, plus the savepoint pair
+        with self.assertNumQueries(9):
+            response = self.client.post(reverse('order_list'), data, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['total'], '30.00')
+        self.assertEqual([line['item']['name'] for line in response.data['items']], ['Margherita', 'Diavola'])
+        self.assertEqual([line['price'] for line in response.data['items']], ['9.50', '11.00'])
+
+    def test_unknown_item_creates_nothing(self):
+        data = {
+            'address': self.address.pk, 'payment_method': 'cash',
+            'items': [{'item': self.margherita.pk, 'quantity': 1}, {'item': 999, 'quantity': 1}],
+        }
+        response = self.client.post(reverse('order_list'), data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['items'][1]['item'], ['Invalid pk "999" - object does not exist.'])
+        self.assertFalse(Order.objects.exists())
+
+
+
+class OrderFastReadTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        address = Address.objects.create(
+            user=self.user, street_address='1 Main St', apartment='4B', city='Cairo', phone='0100'
+        )
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        self.orders = [
+            Order.objects.create(user=self.user, address=address, payment_method='cash', total='19.00'),
+            Order.objects.create(user=self.user, payment_method='bank', total='9.50', status='canceled'),
+        ]
+        for order in self.orders:
+            OrderItem.objects.create(
+                order=order, item=item, quantity=2, price=item.price, special_instructions='Extra basil'
+            )
+        self.client.force_authenticate(self.user)
+
+    def test_matches_the_model_serializers(self):
+        urls = [reverse('order_list') + '?show_canceled=true']
+        urls += [reverse('order_detail', args=[order.pk]) for order in self.orders]
+        for url in urls:
+            with self.subTest(url=url):
+                with override_settings(ORDERS_FAST_READ=True):
+                    fast = self.client.get(url).json()
+                with override_settings(ORDERS_FAST_READ=False):
+                    slow = self.client.get(url).json()
+                self.assertEqual(fast, slow)
+
+
+class IdempotencyKeyTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        self.data = {'address': address.pk, 'payment_method': 'cash', 'items': [{'item': item.pk, 'quantity': 1}]}
+        self.client.force_authenticate(self.user)
+
+    def place(self, data=None, key='checkout-1'):
+        return self.client.post(reverse('order_list'), data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_the_first_response(self):
+        first = self.place()
+        with self.assertNumQueries(1):
+            second = self.place()
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_key_reused_with_another_body(self):
+        self.place()
+        response = self.place({**self.data, 'payment_method': 'bank'})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_keys_are_per_user(self):
+        self.place()
+        other = CustomUser.objects.create_user('other@example.com', 'pw')
+        self.client.force_authenticate(other)
+        address = Address.objects.create(user=other, street_address='2 Side St', city='Giza', phone='0101')
+        self.assertEqual(self.place({**self.data, 'address': address.pk}).status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_failed_placement_stores_no_key(self):
+        self.assertEqual(self.place({**self.data, 'items': [{'item': 999, 'quantity': 1}]}).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.place().status_code, 201)
+
+    def test_expired_key_places_a_new_order(self):
+        self.place()
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.assertEqual(self.place().status_code, 201)
+        self.assertEqual(Order.objects.count(), 2)
+
+    @override_settings(IDEMPOTENCY_SWEEP_RATE=1)
+    def test_placement_sweeps_expired_keys(self):
+        self.place(key='old')
+        IdempotencyKey.objects.update(created_at=timezone.now() - timedelta(days=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.place(key='new')
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+    def test_purge_command(self):
+        self.place(key='old')
+        self.place(key='new')
+        IdempotencyKey.objects.filter(key='old').update(created_at=timezone.now() - timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['new'])
+
+
+class GenerateLoadDataTests(TestCase):
+    def generate(self, **options):
+        options = {'users': 3, 'categories': 2, 'menu_items': 4, 'orders': 20, 'days': 3, **options}
+        call_command('generate_load_data', stdout=StringIO(), **options)
+
+    def test_orders_stay_in_the_past(self):
+        self.generate(until=(timezone.now() + timedelta(days=30)).strftime('%Y-%m-%d'))
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertFalse(Order.objects.filter(created_at__gt=timezone.now()).exists())
+
+    def test_seed_needs_until(self):
+        with self.assertRaises(CommandError):
+            self.generate(seed=1)
+
+    def test_seeded_runs_repeat(self):
+        runs = []
+        for _ in range(2):
+            self.generate(seed=1, until='2024-06-30')
+            runs.append(list(Order.objects.order_by('pk').values_list('created_at', 'status', 'total')))
+            for model in (Order, CustomUser, MenuItem, Category):
+                model.objects.all().delete()
+        self.assertEqual(runs[0], runs[1])
+
+    def test_category_names_in_use(self):
+        Category.objects.create(name='Loadtest Category 1')
+        with self.assertRaises(CommandError):
+            self.generate()
+        self.assertFalse(CustomUser.objects.exists())
+
+
+class OrderExportTests(APITestCase):
+    url = reverse('order_export')
+
+    def setUp(self):
+        user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        pizza = Category.objects.create(name='Pizza')
+        margherita = MenuItem.objects.create(category=pizza, name='Margherita', description='Classic', price='9.50')
+        diavola = MenuItem.objects.create(category=pizza, name='Diavola', description='Spicy', price='11.00')
+        self.cash = Order.objects.create(user=user, payment_method='cash', total='20.50')
+        OrderItem.objects.create(order=self.cash, item=margherita, price='9.50')
+        OrderItem.objects.create(order=self.cash, item=diavola, price='11.00')
+        bank = Order.objects.create(user=user, payment_method='bank', total='9.50')
+        OrderItem.objects.create(order=bank, item=margherita, price='9.50')
+        self.client.force_authenticate(CustomUser.objects.create_user('kitchen@example.com', 'pw', is_staff=True))
+
+    def rows(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    def test_one_row_per_order_line(self):
+        lines = self.rows()
+        self.assertTrue(lines[0].startswith('order_id,created_at'))
+        self.assertEqual(len(lines), 4)
+
+    def test_filters(self):
+        lines = self.rows(payment_method='cash')
+        self.assertEqual({line.split(',')[0] for line in lines[1:]}, {str(self.cash.pk)})
+
+    def test_formula_cells_are_quoted(self):
+        self.cash.items.update(special_instructions='=1+2')
+        body = '\n'.join(self.rows())
+        self.assertIn(",'=1+2", body)
+        self.assertNotIn(',=1+2', body)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('guest@example.com', 'pw'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        pizza = Category.objects.create(name='Pizza')
+        self.margherita = MenuItem.objects.create(category=pizza, name='Margherita', description='Classic', price='9.50')
+        self.diavola = MenuItem.objects.create(category=pizza, name='Diavola', description='Spicy', price='11.00')
+        self.today = sales_day(timezone.now())
+
+    def place_order(self, user=None):
+        user = user or self.user
+        address = self.address if user == self.user else Address.objects.create(
+            user=user, street_address='2 Side St', city='Giza', phone='0101'
+        )
+        self.client.force_authenticate(user)
+        response = self.client.post(reverse('order_list'), {
+            'address': address.pk, 'payment_method': 'cash',
+            'items': [{'item': self.margherita.pk, 'quantity': 2}, {'item': self.diavola.pk, 'quantity': 1}],
+        }, format='json')
+        return Order.objects.get(pk=response.data['id'])
+
+    def test_rollups_follow_orders(self):
+        placed = self.place_order()
+        self.place_order().cancel()
+        transition([placed.pk], 'preparing')
+        self.assertEqual(compare(self.today, self.today), [])
+
+        self.client.force_authenticate(CustomUser.objects.create_user('kitchen@example.com', 'pw', is_staff=True))
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('sales_report'))
+        self.assertEqual(response.data['results'], [{'day': self.today, 'orders': 1, 'revenue': '30.00'}])
+        response = self.client.get(reverse('sales_report'), {'status': 'canceled', 'group_by': 'item'})
+        self.assertEqual(
+            [(row['item_name'], row['quantity'], row['revenue']) for row in response.data['results']],
+            [('Margherita', 2, '19.00'), ('Diavola', 1, '11.00')]
+        )
+
+    def test_deletes_are_uncounted_in_one_pass(self):
+        counts = []
+        for n, email in ((1, 'one@example.com'), (3, 'three@example.com')):
+            user = CustomUser.objects.create_user(email, 'pw')
+            for _ in range(n):
+                self.place_order(user)
+            with CaptureQueriesContext(connection) as queries:
+                user.delete()
+            counts.append(len(queries))
+            self.assertEqual(compare(self.today, self.today), [])
+        self.assertEqual(counts[0], counts[1])
+
+        for _ in range(3):
+            self.place_order()
+        Order.objects.filter(user=self.user).delete()
+        self.assertEqual(compare(self.today, self.today), [])
+        self.assertFalse(DailySales.objects.exclude(orders=0).exists())
+
+    def test_migration_counts_existing_orders(self):
+        self.place_order()
+        self.place_order().cancel()
+        DailySales.objects.all().delete()
+        DailyItemSales.objects.all().delete()
+        migration = import_module('orders.migrations.0008_sales_rollups')
+        migration.fill_rollups(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(compare(self.today, self.today), [])
+
+    def test_report_is_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('sales_report')).status_code, 403)
+
+
+class OrderEventStreamTests(APITestCase):
+    url = reverse('order_events')
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.staff = CustomUser.objects.create_user('kitchen@example.com', 'pw', is_staff=True)
+        address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        self.data = {'address': address.pk, 'payment_method': 'cash', 'items': [{'item': item.pk, 'quantity': 1}]}
+
+    def test_replay_since_last_event_id(self):
+        current = f'{broker.epoch}-{broker.sequence}'
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            order_id = self.client.post(reverse('order_list'), self.data, format='json').data['id']
+        self.client.force_login(self.staff)
+        body = self.client.get(self.url, HTTP_LAST_EVENT_ID=current).content.decode()
+        self.assertIn('event: order.created', body)
+        self.assertIn(f'"id":{order_id}', body)
+        self.assertEqual(body.count('event: '), 1)
+
+    def test_unknown_event_id_resets(self):
+        self.client.force_login(self.staff)
+        body = self.client.get(self.url, HTTP_LAST_EVENT_ID='0-1').content.decode()
+        self.assertIn('event: reset', body)
+
+    def test_staff_only(self):
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_reconnect_gets_no_duplicates(self):
+        local = OrderEventBroker(replay=10)
+
+        async def reconnect():
+            local.publish('order.created', {'id': 1})
+            subscription = local.subscribe(f'{local.epoch}-0')
+            # Published before subscribing but fanned out after: already in the backlog
+            subscription.deliver(list(local.replay))
+            local.publish('order.created', {'id': 2})
+            await asyncio.sleep(0)
+            return subscription.backlog, await subscription.receive(1)
+
+        backlog, live = asyncio.run(reconnect())
+        self.assertEqual([frame.split('\n')[0] for frame in backlog], [f'id: {local.epoch}-1'])
+        self.assertEqual([frame.split('\n')[0] for frame in live], [f'id: {local.epoch}-2'])
+
+
+class TransitionTests(APITestCase):
+    url = reverse('order_batch_status')
+
+    def setUp(self):
+        user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        self.orders = [Order.objects.create(user=user, payment_method='cash', total='9.50') for _ in range(2)]
+        for order in self.orders:
+            OrderItem.objects.create(order=order, item=item, price=item.price)
+        self.order = self.orders[0]
+        today = sales_day(self.order.created_at)
+        rebuild(today, today)
+        self.client.force_authenticate(CustomUser.objects.create_user('kitchen@example.com', 'pw', is_staff=True))
+
+    def test_state_machine(self):
+        self.assertEqual(Order.TRANSITIONS, {
+            'pending': {'preparing', 'canceled'}, 'preparing': {'shipped'},
+            'shipped': {'completed'}, 'completed': set(), 'canceled': set(),
+        })
+
+    def test_results(self):
+        other = self.orders[1]
+        transition([other.pk], 'preparing')
+        results = transition([self.order.pk, other.pk, self.order.pk, 999], 'preparing')
+        self.assertEqual([result['result'] for result in results], [UPDATED, UNCHANGED, NOT_FOUND])
+        results = transition([self.order.pk], 'completed')
+        self.assertEqual(results[0]['result'], INVALID)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('preparing', 2))
+
+    def test_batch_endpoint(self):
+        # Statuses, two rollup reads and upserts, UPDATE, plus the savepoint pair
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                self.url, {'ids': [order.pk for order in self.orders], 'status': 'preparing'}, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 2)
+        response = self.client.post(self.url, {'ids': [self.order.pk], 'status': 'completed'}, format='json')
+        self.assertEqual(response.data['results'][0]['error'], 'Cannot move a preparing order to completed')
+
+    def test_batch_endpoint_is_staff_only(self):
+        self.client.force_authenticate(self.order.user)
+        response = self.client.post(self.url, {'ids': [self.order.pk], 'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_retries_are_not_charged_to_the_request(self):
+        attempts = []
+
+        def conflict_once(queryset, status):
+            attempts.append(status)
+            if len(attempts) == 1:
+                raise TransitionConflict
+            return move_orders(queryset, status)
+
+        with mock.patch('orders.transitions.move_orders', side_effect=conflict_once):
+            response = self.client.post(self.url, {'ids': [self.order.pk], 'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(attempts), 2)
+
+    def test_retries_then_gives_up(self):
+        with mock.patch('orders.transitions._transition', side_effect=TransitionConflict) as attempt:
+            response = self.client.post(self.url, {'ids': [self.order.pk], 'status': 'preparing'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(attempt.call_count, 3)
+
+    def test_conflicting_attempts_write_nothing(self):
+        def kitchen_moves_first(queryset, status):
+            # Another writer moves the order between the read and the UPDATE
+            Order.objects.filter(pk=self.order.pk).update(status='preparing')
+            return move_orders(queryset, status)
+
+        with mock.patch('orders.transitions.move_orders', side_effect=kitchen_moves_first) as moves:
+            with self.assertRaises(TransitionConflict):
+                transition([self.order.pk], 'canceled')
+        self.assertEqual(moves.call_count, 3)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('pending', 1))
+        today = sales_day(self.order.created_at)
+        self.assertEqual(compare(today, today), [])
+
+
+class CancelTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.order = Order.objects.create(user=self.user, payment_method='cash', total='9.50')
+        self.url = reverse('order-cancel', args=[self.order.pk])
+        self.client.force_authenticate(self.user)
+
+    def test_cancel(self):
+        # Read, lines, conditional UPDATE and the order rollup upsert, plus the savepoint pair
+        with self.assertNumQueries(6), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'canceled')
+        self.assertFalse(response.data['can_cancel'])
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.is_active, self.order.version), ('canceled', False, 2))
+        self.assertIsNotNone(self.order.canceled_at)
+
+    def test_only_pending_orders(self):
+        transition([self.order.pk], 'preparing')
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+
+    def test_other_users_orders(self):
+        self.client.force_authenticate(CustomUser.objects.create_user('other@example.com', 'pw'))
+        self.assertEqual(self.client.post(self.url).status_code, 404)
+
+    def test_kitchen_moved_the_order_after_it_was_read(self):
+        order = Order.objects.get(pk=self.order.pk)
+        transition([self.order.pk], 'preparing')
+        self.assertFalse(order.cancel())
+        self.assertEqual(order.status, 'pending')
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'preparing')
+
+    def test_expire_pending(self):
+        fresh = Order.objects.create(user=self.user, payment_method='cash', total='9.50')
+        Order.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(hours=3))
+        self.assertEqual(sum(expire_pending()), 1)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'canceled')
+        self.assertEqual(Order.objects.get(pk=fresh.pk).status, 'pending')
+
+    def test_expire_pending_command(self):
+        Order.objects.filter(pk=self.order.pk).update(created_at=timezone.now() - timedelta(minutes=30))
+        out = StringIO()
+        call_command('expire_pending_orders', '--older-than=10', '--dry-run', stdout=out)
+        self.assertIn('1 orders', out.getvalue())
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'pending')
+        call_command('expire_pending_orders', '--older-than=10', stdout=out)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'canceled')
+
+
+class OrderEditTests(APITestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('diner@example.com', 'pw')
+        self.address = Address.objects.create(user=self.user, street_address='1 Main St', city='Cairo', phone='0100')
+        item = MenuItem.objects.create(
+            category=Category.objects.create(name='Pizza'), name='Margherita', description='Classic', price='9.50'
+        )
+        self.order = Order.objects.create(user=self.user, address=self.address, payment_method='cash', total='9.50')
+        OrderItem.objects.create(order=self.order, item=item, price=item.price)
+        self.url = reverse('order_detail', args=[self.order.pk])
+        self.client.force_authenticate(self.user)
+
+    def test_etag_carries_the_version(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertTrue(etag.startswith(f'"{self.order.version}.'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_patch_with_current_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'special_notes': 'No onions'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['special_notes'], 'No onions')
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response['ETag'], self.client.get(self.url)['ETag'])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.version, 2)
+
+    def test_edits_go_through_model_save(self):
+        saved = []
+
+        def receiver(sender, instance, **kwargs):
+            saved.append(instance.version)
+
+        post_save.connect(receiver, sender=Order)
+        self.addCleanup(post_save.disconnect, receiver, sender=Order)
+        self.client.patch(self.url, {'special_notes': 'No onions'}, format='json')
+        self.assertEqual(saved, [2])
+
+    def test_stale_etag_is_refused(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'special_notes': 'First'}, format='json')
+        response = self.client.patch(self.url, {'special_notes': 'Second'}, format='json', HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.special_notes, 'First')
+
+    def test_address_edit_changes_the_order_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(
+            reverse('address_detail', args=[self.address.pk]), {'city': 'Alexandria'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_stale_address_delete_is_refused(self):
+        url = reverse('address_detail', args=[self.address.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.patch(url, {'city': 'Alexandria'}, format='json')
+        self.assertEqual(self.client.delete(url, HTTP_IF_MATCH=etag).status_code, 412)
+        self.assertEqual(self.client.delete(url, HTTP_IF_MATCH=self.client.get(url)['ETag']).status_code, 204)
+        self.assertFalse(Address.objects.filter(pk=self.address.pk).exists())
+
+    @override_settings(QUERY_BUDGET_ENFORCE=False, QUERY_BUDGET_LOG=False)
+    def test_concurrent_edit_without_if_match_conflicts(self):
+        get_object = OrderDetailView.get_object
+
+        def read_then_lose_the_race(view):
+            order = get_object(view)
+            Order.objects.filter(pk=order.pk).update(special_notes='Theirs', version=order.version + 1)
+            return order
+
+        with mock.patch.object(OrderDetailView, 'get_object', read_then_lose_the_race):
+            response = self.client.patch(self.url, {'special_notes': 'Mine'}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.special_notes, 'Theirs')
+
+    def test_another_users_address_is_refused(self):
+        other = CustomUser.objects.create_user('other@example.com', 'pw')
+        address = Address.objects.create(user=other, street_address='2 Side St', city='Giza', phone='0101')
+        response = self.client.patch(self.url, {'address': address.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_model_save_compares_and_sets_the_version(self):
+        first, second = Order.objects.get(pk=self.order.pk), Order.objects.get(pk=self.order.pk)
+        first.special_notes = 'a'
+        with self.assertNumQueries(1):
+            first.save(update_fields=['special_notes'])
+        self.assertEqual(first.version, 2)
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            second.save()
+        self.assertEqual(second.version, 1)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, 2)
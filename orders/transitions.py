@@ -0,0 +1,116 @@
+"""
+Status changes of many orders at once, checked against Order.TRANSITIONS.
+
+The orders that may move are changed by one conditional UPDATE: its WHERE
+clause repeats the statuses allowed to reach the target, so an order that
+moved on concurrently is left alone. The rollup deltas are written in the
+same transaction and the kitchen board events go out once it commits.
+"""
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from tastybites_api.query_budget import unbudgeted
+
+from .events import status_changed
+from .models import Order
+from .rollups import move_orders
+
+UPDATED = 'updated'
+UNCHANGED = 'unchanged'
+NOT_FOUND = 'not_found'
+INVALID = 'invalid_transition'
+
+ATTEMPTS = 3
+
+
+class TransitionConflict(Exception):
+    """Orders changed status between reading them and the UPDATE, nothing was written"""
+
+
+def sources(status):
+    """The statuses an order may move to ``status`` from"""
+    return sorted(source for source, targets in Order.TRANSITIONS.items() if status in targets)
+
+
+def transition_fields(status, now):
+    """The columns set on orders moving to ``status``"""
+    fields = {'status': status, 'updated_at': now}  # update() skips auto_now
+    if status == 'canceled':
+        fields.update(canceled_at=now, is_active=False)
+    return fields
+
+
+def transition(ids, status, queryset=None):
+    """
+    Moves the orders ``ids`` (among ``queryset``, all orders by default) to
+    ``status`` where the state machine allows it; returns one result per
+    distinct id, in order. Retries when orders change concurrently, then
+    raises TransitionConflict. Only the first attempt counts towards the
+    caller's query budget: retries are the price of contention, not of
+    the request.
+    """
+    ids = list(dict.fromkeys(ids))
+    queryset = Order.objects.all() if queryset is None else queryset
+    for attempt in range(1, ATTEMPTS + 1):
+        with unbudgeted() if attempt > 1 else nullcontext():
+            try:
+                return _transition(ids, status, queryset)
+            except TransitionConflict:
+                if attempt == ATTEMPTS:
+                    raise
+
+
+def _transition(ids, status, queryset):
+    allowed = sources(status)
+    now = timezone.now()
+    with transaction.atomic():
+        current = dict(queryset.filter(pk__in=ids).order_by().values_list('pk', 'status'))
+        movable = [pk for pk in ids if current.get(pk) in allowed]
+        if movable:
+            targets = Order.objects.filter(pk__in=movable, status__in=allowed)
+            move_orders(targets, status)
+            if targets.update(**transition_fields(status, now), version=F('version') + 1) != len(movable):
+                # The deltas counted orders that have moved since, roll them back
+                raise TransitionConflict
+            for pk in movable:
+                status_changed(Order(pk=pk, status=status, updated_at=now), current[pk])
+
+    moved = set(movable)
+    results = []
+    for pk in ids:
+        previous = current.get(pk)
+        if previous is None:
+            results.append({'id': pk, 'result': NOT_FOUND})
+        elif pk in moved:
+            results.append({'id': pk, 'result': UPDATED, 'status': status, 'previous_status': previous})
+        elif previous == status:
+            results.append({'id': pk, 'result': UNCHANGED, 'status': status})
+        else:
+            results.append({
+                'id': pk, 'result': INVALID, 'status': previous,
+                'error': f'Cannot move a {previous} order to {status}',
+            })
+    return results
+
+
+def stale_pending_orders(before=None):
+    """Pending orders placed before ``before`` (PENDING_ORDER_EXPIRY ago by default)"""
+    if before is None:
+        before = timezone.now() - timedelta(minutes=settings.PENDING_ORDER_EXPIRY)
+    return Order.objects.filter(status='pending', created_at__lt=before)
+
+
+def expire_pending(before=None, batch_size=500):
+    """
+    Cancels the stale pending orders, oldest first, one transaction and one
+    conditional UPDATE per batch of ids read from the (status, created_at)
+    index; yields the number canceled per batch.
+    """
+    stale = stale_pending_orders(before)
+    while ids := list(stale.order_by('created_at').values_list('pk', flat=True)[:batch_size]):
+        # Orders moved on meanwhile are skipped and not read again
+        yield sum(result['result'] == UPDATED for result in transition(ids, 'canceled', stale))
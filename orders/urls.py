@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import AddressListView, AddressDetailView, OrderListView, OrderDetailView,OrderCancelView
+from .views import AddressListView, AddressDetailView, OrderListView, OrderDetailView,OrderCancelView, OrderExportView, SalesReportView, OrderEventStreamView, OrderBatchStatusView
 
 urlpatterns = [
     path('addresses/', AddressListView.as_view(), name='address_list'),
@@ -7,4 +7,8 @@ urlpatterns = [
     path('', OrderListView.as_view(), name='order_list'),
     path('<int:pk>/', OrderDetailView.as_view(), name='order_detail'),
     path('orders/<int:pk>/cancel/', OrderCancelView.as_view(), name='order-cancel'),
+    path('status/', OrderBatchStatusView.as_view(), name='order_batch_status'),
+    path('export/', OrderExportView.as_view(), name='order_export'),
+    path('analytics/sales/', SalesReportView.as_view(), name='sales_report'),
+    path('events/', OrderEventStreamView.as_view(), name='order_events'),
 ]
\ No newline at end of file
@@ -1,14 +1,40 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch, Sum, prefetch_related_objects
 from django.utils import timezone
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from .models import Address, Order
-from .serializers import AddressSerializer, OrderSerializer, CreateOrderSerializer, OrderStatusSerializer
+from django.views import View
+from menu.cache import get_menu_version
+from tastybites_api.mixins import ConditionalGetMixin, VersionedWriteMixin
+from tastybites_api.query_budget import QueryBudgetMixin
+from .board import NotAllowed, authorize, last_event_id
+from .events import broker
+from .export import aiter_csv, filter_lines, iter_csv
+from .fast_serializers import order_rows, serialize_order_rows
+from .idempotency import HEADER as IDEMPOTENCY_HEADER, find_key, request_fingerprint, sweep_expired_keys
+from .models import Address, IdempotencyKey, Order, OrderItem
+from .pagination import OrderCursorPagination
+from .rollups import report
+from .transitions import UPDATED, TransitionConflict, transition
+from .serializers import (
+    AddressSerializer, OrderSerializer, CreateOrderSerializer, OrderStatusSerializer, OrderExportFilterSerializer,
+    SalesReportFilterSerializer, OrderBatchStatusSerializer, OrderUpdateSerializer
+)
 
-class AddressListView(generics.ListCreateAPIView):
+# OrderSerializer nests item -> menu item -> category, fetch them in one query
+ORDER_ITEMS_PREFETCH = Prefetch(
+    'items', queryset=OrderItem.objects.select_related('item__category').order_by('id')
+)
+
+class AddressListView(QueryBudgetMixin, generics.ListCreateAPIView):
     serializer_class = AddressSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {'GET': 1, 'POST': 1}
     
     def get_queryset(self):
         """Returns only the current user's addresses"""
@@ -18,16 +44,48 @@ class AddressListView(generics.ListCreateAPIView):
         """Automatically sets the user"""
         serializer.save(user=self.request.user)
 
-class AddressDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AddressDetailView(QueryBudgetMixin, VersionedWriteMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AddressSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # DELETE: read, version UPDATE, orders' address set to NULL, DELETE
+    query_budget = {'GET': 1, 'PUT': 2, 'PATCH': 2, 'DELETE': 4}
     
     def get_queryset(self):
         """Ensures users can only access their own addresses"""
         return Address.objects.filter(user=self.request.user)
 
-class OrderListView(generics.ListCreateAPIView):
+class OrderConditionalGetMixin(ConditionalGetMixin):
+    """Validators derived from one aggregate over the user's orders"""
+
+    def get_conditional_queryset(self):
+        return self.filter_queryset(self.get_queryset())
+
+    def get_order_state(self):
+        if not hasattr(self, '_order_state'):
+            self._order_state = self.get_conditional_queryset().order_by().aggregate(
+                last_modified=Max('updated_at'), count=Count('id'), addresses=Sum('address__version')
+            )
+        return self._order_state
+
+    def get_etag(self, request, *args, **kwargs):
+        state = self.get_order_state()
+        if not state['count']:
+            return None
+        # Orders nest their address and menu items, so edits of those must
+        # also change the tag
+        return '{}:{}:{}:{}:{}'.format(
+            state['last_modified'].isoformat(), state['count'], state['addresses'],
+            get_menu_version(), request.accepted_renderer.format
+        )
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return self.get_order_state()['last_modified']
+
+class OrderListView(QueryBudgetMixin, OrderConditionalGetMixin, generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderCursorPagination
+    # A keyed POST adds the key lookup, an expired key's delete and the insert
+    query_budget = {'GET': 3, 'POST': 10}
     
     def get_serializer_class(self):
         return CreateOrderSerializer if self.request.method == 'POST' else OrderSerializer
@@ -35,7 +93,7 @@ class OrderListView(generics.ListCreateAPIView):
     def get_queryset(self):
         queryset = Order.objects.filter(
             user=self.request.user
-        ).select_related('address').prefetch_related('items__item')
+        ).select_related('address').prefetch_related(ORDER_ITEMS_PREFETCH)
         
         if status := self.request.query_params.get('status'):
             queryset = queryset.filter(status=status)
@@ -44,24 +102,125 @@ class OrderListView(generics.ListCreateAPIView):
             queryset = queryset.exclude(status='canceled')
             
         return queryset.order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        if not settings.ORDERS_FAST_READ:
+            return super().list(request, *args, **kwargs)
+        rows = order_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_order_rows(page, request))
+        return Response(serialize_order_rows(rows, request))
     
     def post(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return self.place_order(request)
+
+        if len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} is too long'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_fingerprint(request.data)
+        if record := find_key(request.user, key):
+            return self.replay(record, fingerprint)
+
+        try:
+            with transaction.atomic():
+                response = self.place_order(request)
+                if response.status_code == status.HTTP_201_CREATED:
+                    # A concurrent retry that stored the key first wins and
+                    # this order is rolled back with the failed insert
+                    IdempotencyKey.objects.create(
+                        user=request.user, key=key, request_hash=fingerprint,
+                        response_body=response.data, status_code=response.status_code
+                    )
+                    transaction.on_commit(sweep_expired_keys)
+        except IntegrityError:
+            if record := find_key(request.user, key):
+                return self.replay(record, fingerprint)
+            raise
+        return response
+
+    def place_order(self, request):
         serializer = CreateOrderSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             order = serializer.save()
+            prefetch_related_objects([order], ORDER_ITEMS_PREFETCH)
             return Response(OrderSerializer(order, context={'request': request}).data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def replay(self, record, fingerprint):
+        """Returns the stored response if the retry carries the same body"""
+        if record.request_hash != fingerprint:
+            return Response(
+                {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        return Response(record.response_body, status=record.status_code)
 
-class OrderDetailView(generics.RetrieveUpdateAPIView):  # Changed to support updates
-    serializer_class = OrderSerializer
+
+class OrderDetailView(QueryBudgetMixin, VersionedWriteMixin, generics.RetrieveUpdateAPIView):  # Changed to support updates
     permission_classes = [permissions.IsAuthenticated]
+    # PUT/PATCH: order, items, new address, UPDATE
+    query_budget = {'GET': 3, 'PUT': 4, 'PATCH': 4}
+
+    def get_serializer_class(self):
+        return OrderSerializer if self.request.method == 'GET' else OrderUpdateSerializer
+
+    def get_conditional_queryset(self):
+        return self.get_queryset().filter(pk=self.kwargs['pk'])
+
+    def get_order_state(self):
+        # The validators of a GET, read without loading the order
+        if not hasattr(self, '_order_state'):
+            self._order_state = self.get_conditional_queryset().order_by().values(
+                'version', 'updated_at', 'address__version'
+            ).first()
+        return self._order_state
+
+    def get_etag_variant(self, request, obj):
+        return self.order_etag_variant(request, obj.address.version if obj.address_id else None)
+
+    def order_etag_variant(self, request, address_version):
+        # Orders nest their address and menu items, edits of those change the tag too
+        return address_version, get_menu_version(), request.accepted_renderer.format
+
+    def get_etag(self, request, *args, **kwargs):
+        state = self.get_order_state()
+        if state is None:
+            return None
+        return state['version'], self.order_etag_variant(request, state['address__version'])
+
+    def get_last_modified(self, request, *args, **kwargs):
+        state = self.get_order_state()
+        return state and state['updated_at']
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.ORDERS_FAST_READ:
+            return super().retrieve(request, *args, **kwargs)
+        data = serialize_order_rows(order_rows(self.get_conditional_queryset()), request)
+        if not data:
+            raise Http404
+        return Response(data[0])
+    
+    def update(self, request, *args, **kwargs):
+        order = self.get_object()
+        serializer = self.get_serializer(order, data=request.data, partial=kwargs.get('partial', False))
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        # Answer with the whole order, as GET does; its prefetched lines did not change
+        response = Response(OrderSerializer(order, context=self.get_serializer_context()).data)
+        response['ETag'] = self.get_object_etag(request, order)
+        return response
     
     def get_queryset(self):
         """Secure queryset with user filter and optimizations"""
         return Order.objects.filter(
             user=self.request.user
-        ).select_related('address').prefetch_related('items__item')
+        ).select_related('address').prefetch_related(ORDER_ITEMS_PREFETCH)
 
 class OrderStatusView(generics.UpdateAPIView):
     """For updating order status (e.g., preparing -> shipped)"""
@@ -71,22 +230,106 @@ class OrderStatusView(generics.UpdateAPIView):
     def get_queryset(self):
         return Order.objects.filter(user=self.request.user)
 
-class OrderCancelView(APIView):
+class OrderCancelView(QueryBudgetMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5  # read, lines, conditional UPDATE and the two rollup upserts
     
     def post(self, request, pk):
         """Handles order cancellation with validation"""
-        order = get_object_or_404(Order, pk=pk, user=request.user)
+        order = get_object_or_404(
+            Order.objects.select_related('address').prefetch_related(ORDER_ITEMS_PREFETCH),
+            pk=pk, user=request.user
+        )
         
-        if order.status != 'pending':
+        # False as well when the kitchen moved the order on after it was read
+        if not order.cancel():
             return Response(
                 {'error': 'Only pending orders can be canceled'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        order.cancel()  # Using the model method we created
-        
         return Response(
             OrderSerializer(order, context={'request': request}).data,
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class OrderBatchStatusView(QueryBudgetMixin, APIView):
+    """Staff: move many orders to one status (e.g. preparing -> shipped), each checked against Order.TRANSITIONS"""
+    permission_classes = [permissions.IsAdminUser]
+    # statuses, two rollup reads and upserts, one UPDATE; transition()
+    # retries are not charged to the request
+    query_budget = 6
+
+    def post(self, request):
+        serializer = OrderBatchStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        target = serializer.validated_data['status']
+        try:
+            results = transition(serializer.validated_data['ids'], target)
+        except TransitionConflict:
+            return Response(
+                {'error': 'The orders kept changing status, try again'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response({
+            'status': target,
+            'updated': sum(result['result'] == UPDATED for result in results),
+            'results': results,
+        })
+
+
+class OrderExportView(APIView):
+    """Staff CSV export of order lines, streamed as it is read"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        filters = OrderExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        queryset = filter_lines(**filters.get_filters())
+
+        # Under ASGI a sync iterator would be read to the end before sending
+        streaming = aiter_csv(queryset) if isinstance(request._request, ASGIRequest) else iter_csv(queryset)
+        response = StreamingHttpResponse(streaming, content_type='text/csv; charset=utf-8')
+        params = filters.validated_data
+        name = '-'.join(['orders', *(str(params[key]) for key in ('date_from', 'date_to') if key in params)])
+        response['Content-Disposition'] = f'attachment; filename="{name}.csv"'
+        return response
+
+
+class SalesReportView(QueryBudgetMixin, APIView):
+    """Staff sales figures per day, menu item and/or category, read from the daily rollups"""
+    permission_classes = [permissions.IsAdminUser]
+    query_budget = 1
+
+    def get(self, request):
+        filters = SalesReportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        params = filters.get_filters()
+        return Response({
+            'date_from': params['date_from'], 'date_to': params['date_to'],
+            'statuses': params['statuses'], 'group_by': params['group_by'],
+            'results': report(**params),
+        })
+
+
+class OrderEventStreamView(View):
+    """
+    Staff kitchen board events (see orders.events). Under ASGI
+    ``tastybites_api.asgi`` serves this URL as a live Server-Sent Events
+    stream (orders.board); this view answers where that is not in front,
+    e.g. under WSGI, with the events missed since Last-Event-ID, and the
+    client polls by reconnecting after the ``retry`` delay.
+    """
+
+    async def get(self, request):
+        try:
+            await authorize(request)
+        except NotAllowed as exc:
+            return JsonResponse(exc.detail, status=exc.status)
+        response = HttpResponse(
+            f'retry: {settings.ORDER_EVENTS_RETRY_MS}\n\n' + ''.join(broker.catch_up(last_event_id(request))),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        return response
@@ -0,0 +1,139 @@
+"""
+Admin building blocks for tables with millions of rows.
+
+A stock changelist counts the filtered rows on every page view and the
+date hierarchy reads every row to list the years, months or days with
+data; both are full table scans. ``LargeTableAdmin`` replaces them with
+index lookups:
+
+* ``EstimatedCountPaginator`` counts exactly up to
+  ``ADMIN_COUNT_ESTIMATE_THRESHOLD`` rows. Past that an unfiltered list
+  reports the table's estimated size and a filtered one the threshold plus
+  one, since the database cannot estimate a WHERE clause cheaply.
+* ``SeekingQuerySet`` finds the periods of the date hierarchy by seeking
+  to the first row of each one on the date field's index.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Min, QuerySet
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+
+def estimate_table_rows(model, using='default'):
+    """Approximate number of rows in a model's table without scanning it, or None"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1 until the table is first vacuumed or analyzed
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite' and model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+            # The span of the integer primary key: two b-tree lookups, and an
+            # upper bound once rows are deleted
+            column = connection.ops.quote_name(model._meta.pk.column)
+            cursor.execute(
+                f'SELECT (SELECT MAX({column}) FROM {table}) - (SELECT MIN({column}) FROM {table}) + 1'
+            )
+            return cursor.fetchone()[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        threshold = settings.ADMIN_COUNT_ESTIMATE_THRESHOLD
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > threshold:
+                return estimate
+            return super().count
+        # COUNT(*) over a LIMIT subquery stops reading after threshold + 1 rows
+        return queryset.order_by()[:threshold + 1].count()
+
+
+def truncate(value, kind):
+    if kind == 'year':
+        value = value.replace(month=1, day=1)
+    elif kind == 'month':
+        value = value.replace(day=1)
+    if hasattr(value, 'hour'):
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    return value
+
+
+def next_period(start, kind):
+    if kind == 'year':
+        return start.replace(year=start.year + 1)
+    if kind == 'month':
+        return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    # Wall clock arithmetic on aware datetimes, so DST days still end at midnight
+    return start + timedelta(days=1)
+
+
+class SeekingQuerySet(QuerySet):
+    """
+    ``dates()``/``datetimes()`` by year, month or day with one MIN() per
+    period that has rows, instead of truncating and de-duplicating every
+    row. Each MIN() is answered from an index on the date field (or on the
+    filtered columns followed by it), so a year costs at most 12 lookups.
+    """
+
+    def _seek_periods(self, field_name, kind, order, convert):
+        queryset = self.order_by()
+        periods = []
+        lower = None
+        while True:
+            bounded = queryset if lower is None else queryset.filter(**{f'{field_name}__gte': lower})
+            first = bounded.aggregate(first=Min(field_name))['first']
+            if first is None:
+                break
+            periods.append(truncate(convert(first), kind))
+            lower = next_period(periods[-1], kind)
+        return periods[::-1] if order == 'DESC' else periods
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        return self._seek_periods(field_name, kind, order, lambda value: value)
+
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None):
+        if kind not in ('year', 'month', 'day'):
+            return super().datetimes(field_name, kind, order, tzinfo)
+        if settings.USE_TZ:
+            tz = tzinfo or timezone.get_current_timezone()
+            return self._seek_periods(field_name, kind, order, lambda value: timezone.localtime(value, tz))
+        return self._seek_periods(field_name, kind, order, lambda value: value)
+
+    def aggregate(self, *args, **kwargs):
+        # SQLite answers a lone MIN() or MAX() of an indexed column with one
+        # index lookup, but scans the index for both in one query (the date
+        # hierarchy's range check)
+        if (not args and len(kwargs) > 1 and connections[self.db].vendor == 'sqlite'
+                and all(type(aggregate) in (Min, Max) and aggregate.filter is None
+                        for aggregate in kwargs.values())):
+            result = {}
+            for alias, aggregate in kwargs.items():
+                result.update(super().aggregate(**{alias: aggregate}))
+            return result
+        return super().aggregate(*args, **kwargs)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    # Skips the second, unfiltered COUNT(*) behind "N results (M total)"
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return SeekingQuerySet(queryset.model, query=queryset.query.chain(),
+                               using=queryset._db, hints=queryset._hints)
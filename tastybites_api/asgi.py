@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tastybites_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up; serves the kitchen board event stream
+# without a thread per open connection (see orders.board)
+from orders.board import route  # noqa: E402
+
+application = route(django_application)
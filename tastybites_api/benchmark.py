@@ -0,0 +1,444 @@
+"""
+In-process HTTP benchmarks against the WSGI and ASGI applications.
+
+Scenarios turn into lists of ``Call`` objects up front, so building them
+(and any database rows they consume) is never timed. Drivers then push the
+calls through the full middleware stack, one at a time or ``concurrency``
+at once (threads under WSGI, tasks under ASGI), and record status,
+latency, response size and the query count ``PerformanceMiddleware``
+reports in its ``Server-Timing`` header. The ``benchmark_api`` command
+runs them, saves the results as JSON and compares two runs.
+"""
+import asyncio
+import json
+import math
+import re
+import threading
+import time
+from decimal import Decimal
+from fnmatch import fnmatch
+from urllib.parse import urlencode
+
+from django.contrib.auth.hashers import make_password
+from django.db import connections
+from django.test import RequestFactory
+from accounts.models import CustomUser
+from accounts.serializers import CustomTokenObtainPairSerializer
+from menu.models import Category, MenuItem, category_slug
+from orders.models import Address, Order, OrderItem
+
+PASSWORD = 'bench-password-1'
+MENU_CATEGORIES = 6
+MENU_ITEMS = 60
+LINES_PER_ORDER = 3
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Call:
+    __slots__ = ('method', 'path', 'body', 'headers', 'expect')
+
+    def __init__(self, method, path, body=None, headers=None, expect=200):
+        self.method = method
+        self.path = path
+        self.body = b'' if body is None else json.dumps(body).encode()
+        self.headers = headers or {}
+        self.expect = expect
+
+
+class Sample:
+    __slots__ = ('status', 'duration', 'queries', 'size')
+
+    def __init__(self, status, duration, queries, size):
+        self.status = status
+        self.duration = duration
+        self.queries = queries
+        self.size = size
+
+
+def queries_from_headers(value):
+    match = SERVER_TIMING_QUERIES.search(value or '')
+    return int(match.group(1)) if match else 0
+
+
+def run_threads(function, items, concurrency):
+    """``function`` over ``items`` from ``concurrency`` threads, each with its own database connection"""
+    results = [None] * len(items)
+    pending = iter(enumerate(items))
+    lock = threading.Lock()
+
+    def work():
+        try:
+            while True:
+                with lock:
+                    index, item = next(pending, (None, None))
+                if index is None:
+                    return
+                results[index] = function(item)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=work) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class WSGIDriver:
+    name = 'wsgi'
+
+    def __init__(self):
+        from tastybites_api.wsgi import application
+        self.application = application
+        self.factory = RequestFactory()
+
+    def environ(self, call):
+        return self.factory.generic(
+            call.method, call.path, call.body, content_type='application/json', headers=call.headers
+        ).environ
+
+    def run(self, calls, concurrency=1):
+        environs = [self.environ(call) for call in calls]
+        if concurrency > 1:
+            return run_threads(self.call, environs, concurrency)
+        return [self.call(environ) for environ in environs]
+
+    def call(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = dict(headers)
+
+        start = time.perf_counter()
+        response = self.application(environ, start_response)
+        try:
+            size = sum(len(chunk) for chunk in response)
+        finally:
+            response.close()
+        duration = time.perf_counter() - start
+        return Sample(
+            started['status'], duration,
+            queries_from_headers(started['headers'].get('Server-Timing')), size
+        )
+
+
+class ASGIDriver:
+    name = 'asgi'
+
+    def __init__(self):
+        from tastybites_api.asgi import application
+        self.application = application
+
+    def scope(self, call):
+        path, _, query = call.path.partition('?')
+        headers = [(b'host', b'testserver')]
+        headers += [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                    for name, value in call.headers.items()]
+        if call.body:
+            headers += [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(call.body)).encode())]
+        return {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': call.method, 'scheme': 'http', 'path': path,
+            'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': headers, 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        }
+
+    def run(self, calls, concurrency=1):
+        return asyncio.run(self.run_all([(self.scope(call), call.body) for call in calls], concurrency))
+
+    async def run_all(self, requests, concurrency):
+        if concurrency == 1:
+            return [await self.call(scope, body) for scope, body in requests]
+        slots = asyncio.Semaphore(concurrency)
+
+        async def limited(scope, body):
+            async with slots:
+                return await self.call(scope, body)
+
+        return await asyncio.gather(*(limited(scope, body) for scope, body in requests))
+
+    async def call(self, scope, body):
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        response = {'status': None, 'headers': {}, 'size': 0}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # The client never disconnects; Django cancels this once it responded
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = {name.lower(): value for name, value in message.get('headers', [])}
+            elif message['type'] == 'http.response.body':
+                response['size'] += len(message.get('body', b''))
+
+        start = time.perf_counter()
+        await self.application(scope, receive, send)
+        duration = time.perf_counter() - start
+        timing = response['headers'].get(b'server-timing', b'').decode('latin-1')
+        return Sample(response['status'], duration, queries_from_headers(timing), response['size'])
+
+
+DRIVERS = {driver.name: driver for driver in (WSGIDriver, ASGIDriver)}
+
+
+class BenchmarkData:
+    """Menu, users and order histories the scenarios run against"""
+
+    def __init__(self, history_sizes):
+        self.password_hash = make_password(PASSWORD)
+        categories = Category.objects.bulk_create(
+            [Category(name=f'Bench Category {i}', slug=category_slug(f'Bench Category {i}'))
+             for i in range(MENU_CATEGORIES)]
+        )
+        self.category = categories[0]
+        self.menu_items = MenuItem.objects.bulk_create([
+            MenuItem(
+                name=f'Bench Item {i}', description='Benchmark menu item',
+                price=Decimal(50 + i) + Decimal('0.50'),
+                category=categories[i % len(categories)], image='',
+            )
+            for i in range(MENU_ITEMS)
+        ])
+        self.login = self.create_user('login')
+        self.reader = self.create_user('reader')
+        self.reader_order = self.create_orders(self.reader, 1)[0]
+        self.shopper = self.create_user('shopper')
+        self.canceler = self.create_user('canceler')
+        self.staff = self.create_user('staff', is_staff=True)
+        self.histories = {}
+        for size in history_sizes:
+            self.histories[size] = account = self.create_user(f'history-{size}')
+            self.create_orders(account, size)
+
+    def create_user(self, label, is_staff=False):
+        user = CustomUser.objects.create(
+            email=f'bench-{label}@example.com', password=self.password_hash, first_name='Bench',
+            is_staff=is_staff
+        )
+        address = Address.objects.create(
+            user=user, street_address='1 Bench St', city='Cairo', phone='01000000000', default=True
+        )
+        refresh = CustomTokenObtainPairSerializer.get_token(user)
+        return {
+            'user': user, 'address': address, 'refresh': str(refresh),
+            'headers': {'Authorization': f'Bearer {refresh.access_token}'},
+        }
+
+    def create_orders(self, account, count, status='completed', batch_size=2000):
+        """Orders with LINES_PER_ORDER lines each, returns their pks"""
+        lines = self.menu_items[:LINES_PER_ORDER]
+        total = sum((item.price for item in lines), Decimal('0.00'))
+        pks = []
+        for start in range(0, count, batch_size):
+            orders = Order.objects.bulk_create([
+                Order(user=account['user'], address=account['address'], payment_method='cash',
+                      status=status, total=total)
+                for _ in range(min(batch_size, count - start))
+            ])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, item=item, price=item.price, quantity=1)
+                for order in orders for item in lines
+            ])
+            pks.extend(order.pk for order in orders)
+        return pks
+
+
+class Scenario:
+    """A named endpoint workload; ``build(data, count, tag)`` returns its calls"""
+
+    def __init__(self, name, build, hashes_password=False):
+        self.name = name
+        self.build = build
+        self.hashes_password = hashes_password
+
+
+def register_calls(data, count, tag):
+    return [
+        Call('POST', '/api/auth/register/', {
+            'email': f'bench-register-{tag}-{i}@example.com', 'password': PASSWORD,
+            'first_name': 'Bench', 'last_name': 'Register',
+        }, expect=201)
+        for i in range(count)
+    ]
+
+
+def login_calls(data, count, tag):
+    body = {'email': data.login['user'].email, 'password': PASSWORD}
+    return [Call('POST', '/api/auth/login/', body) for _ in range(count)]
+
+
+def refresh_calls(data, count, tag):
+    return [Call('POST', '/api/auth/refresh/', {'refresh': data.login['refresh']}) for _ in range(count)]
+
+
+def me_calls(data, count, tag):
+    return [Call('GET', '/api/auth/me/', headers=data.reader['headers']) for _ in range(count)]
+
+
+def menu_calls(path):
+    def build(data, count, tag):
+        return [Call('GET', path) for _ in range(count)]
+    return build
+
+
+def menu_category_calls(data, count, tag):
+    path = '/api/menu/items/?' + urlencode({'category': data.category.slug})
+    return [Call('GET', path) for _ in range(count)]
+
+
+def address_list_calls(data, count, tag):
+    return [Call('GET', '/api/orders/addresses/', headers=data.reader['headers']) for _ in range(count)]
+
+
+def address_create_calls(data, count, tag):
+    body = {'street_address': '2 Bench St', 'city': 'Giza', 'phone': '01000000001'}
+    return [Call('POST', '/api/orders/addresses/', body, data.shopper['headers'], expect=201)
+            for _ in range(count)]
+
+
+def order_create_calls(lines):
+    def build(data, count, tag):
+        body = {
+            'address': data.shopper['address'].pk, 'payment_method': 'cash',
+            'items': [{'item': item.pk, 'quantity': 1} for item in data.menu_items[:lines]],
+        }
+        return [Call('POST', '/api/orders/', body, data.shopper['headers'], expect=201)
+                for _ in range(count)]
+    return build
+
+
+def order_status_batch_calls(data, count, tag, size=5):
+    # Every batch moves its own pending orders to preparing
+    pks = data.create_orders(data.canceler, count * size, status='pending')
+    return [Call('POST', '/api/orders/status/', {'ids': pks[i:i + size], 'status': 'preparing'},
+                 data.staff['headers'])
+            for i in range(0, len(pks), size)]
+
+
+def order_mixed_calls(data, count, tag):
+    # Checkouts between order reads, readers and the writer contend when concurrent
+    creates = order_create_calls(LINES_PER_ORDER)(data, count, tag)
+    reads = [
+        Call('GET', f'/api/orders/{data.reader_order}/', headers=data.reader['headers']),
+        Call('GET', '/api/orders/', headers=data.reader['headers']),
+    ]
+    return [creates[i] if i % 3 == 0 else reads[i % 3 - 1] for i in range(count)]
+
+
+def order_list_calls(size):
+    def build(data, count, tag):
+        return [Call('GET', '/api/orders/', headers=data.histories[size]['headers']) for _ in range(count)]
+    return build
+
+
+def order_detail_calls(data, count, tag):
+    return [Call('GET', f'/api/orders/{data.reader_order}/', headers=data.reader['headers'])
+            for _ in range(count)]
+
+
+def order_cancel_calls(data, count, tag):
+    # Every cancel needs its own pending order
+    return [Call('POST', f'/api/orders/orders/{pk}/cancel/', headers=data.canceler['headers'])
+            for pk in data.create_orders(data.canceler, count, status='pending')]
+
+
+def scenarios(history_sizes):
+    return [
+        Scenario('auth.register', register_calls, hashes_password=True),
+        Scenario('auth.login', login_calls, hashes_password=True),
+        Scenario('auth.refresh', refresh_calls),
+        Scenario('auth.me', me_calls),
+        Scenario('menu.categories', menu_calls('/api/menu/categories/')),
+        Scenario('menu.items', menu_calls('/api/menu/items/')),
+        Scenario('menu.items_by_category', menu_category_calls),
+        Scenario('menu.items_page', menu_calls('/api/menu/items/?page_size=20&fields=id,name,price,image')),
+        Scenario('menu.search', menu_calls('/api/menu/search/?q=bench+ite')),
+        Scenario('addresses.list', address_list_calls),
+        Scenario('addresses.create', address_create_calls),
+        *[Scenario(f'orders.create@{lines}', order_create_calls(lines)) for lines in (1, 10, 50)],
+        *[Scenario(f'orders.list@{size}', order_list_calls(size)) for size in history_sizes],
+        Scenario('orders.detail', order_detail_calls),
+        Scenario('orders.cancel', order_cancel_calls),
+        Scenario('orders.status_batch', order_status_batch_calls),
+        Scenario('orders.mixed', order_mixed_calls),
+    ]
+
+
+def select(all_scenarios, patterns):
+    if not patterns:
+        return all_scenarios
+    return [s for s in all_scenarios if any(fnmatch(s.name, pattern) for pattern in patterns)]
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def summarize(calls, samples, wall):
+    durations = sorted(sample.duration * 1000 for sample in samples)
+    count = len(samples)
+    return {
+        'requests': count,
+        'errors': sum(sample.status != call.expect for call, sample in zip(calls, samples)),
+        'statuses': sorted({sample.status for sample in samples}),
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'p99_ms': round(percentile(durations, 99), 3),
+        'mean_ms': round(sum(durations) / count, 3),
+        'max_ms': round(durations[-1], 3),
+        'throughput_rps': round(count / wall, 1),
+        'queries_per_request': round(sum(sample.queries for sample in samples) / count, 2),
+        'max_queries': max(sample.queries for sample in samples),
+        'mean_bytes': round(sum(sample.size for sample in samples) / count),
+    }
+
+
+def run_scenario(driver, scenario, data, iterations, warmup, concurrency=1):
+    calls = scenario.build(data, warmup + iterations, driver.name)
+    driver.run(calls[:warmup], concurrency)
+    measured = calls[warmup:]
+    start = time.perf_counter()
+    samples = driver.run(measured, concurrency)
+    return summarize(measured, samples, time.perf_counter() - start)
+
+
+def compare(baseline, current, max_regression=None, noise_ms=1.0):
+    """
+    Per scenario deltas of ``current`` against ``baseline`` results.
+
+    Returns ``(rows, regressions)``; a scenario regresses when its p95 grew
+    by more than ``max_regression`` percent (and more than ``noise_ms``),
+    when it runs more queries per request, or when it returned errors.
+    """
+    rows, regressions = [], []
+    for interface, results in current['results'].items():
+        for name, now in results.items():
+            before = baseline['results'].get(interface, {}).get(name)
+            if before is None:
+                continue
+            deltas = {
+                metric: (now[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+                for metric in ('p50_ms', 'p95_ms', 'p99_ms')
+            }
+            problems = []
+            if now['errors']:
+                problems.append(f"{now['errors']} errors")
+            if max_regression is not None:
+                grown = now['p95_ms'] - before['p95_ms']
+                if grown > noise_ms and deltas['p95_ms'] > max_regression:
+                    problems.append(f"p95 {before['p95_ms']:.2f} -> {now['p95_ms']:.2f} ms")
+                if now['queries_per_request'] > before['queries_per_request']:
+                    problems.append(
+                        f"queries {before['queries_per_request']:g} -> {now['queries_per_request']:g}"
+                    )
+            rows.append((interface, name, before, now, deltas))
+            regressions.extend(f'{interface} {name}: {problem}' for problem in problems)
+    return rows, regressions
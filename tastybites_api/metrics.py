@@ -0,0 +1,152 @@
+"""
+In-process request metrics, exported in the Prometheus text format.
+
+``PerformanceMiddleware`` opens a ``RequestStats`` for each request in a
+context variable; the DB execute wrapper and ``measure_serialization``
+add to it, so the numbers follow the request into sync_to_async threads.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Upper bounds of the latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+current_stats = ContextVar('current_stats', default=None)
+
+
+def view_name(request):
+    """Resolved URL name of the request, the label metrics are kept under"""
+    match = getattr(request, 'resolver_match', None)
+    return (match.url_name or match.view_name) if match else 'unresolved'
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth', 'inspector')
+
+    def __init__(self, inspector=None):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+        self.inspector = inspector  # QueryInspector on sampled requests
+
+
+def record_query(execute, sql, params, many, context):
+    """DB execute wrapper charging query count and time to the current request"""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        stats.db_time += duration
+        stats.queries += 1
+        if stats.inspector is not None:
+            stats.inspector.record(sql, duration)
+
+
+@contextmanager
+def measure_serialization():
+    """Charges the block to the current request's serializer time (outermost only)"""
+    stats = current_stats.get()
+    if stats is None:
+        yield
+        return
+    stats.serializer_depth += 1
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_depth -= 1
+        if not stats.serializer_depth:
+            stats.serializer_time += time.perf_counter() - start
+
+
+def measured_serialization(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with measure_serialization():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+class ViewMetrics:
+    __slots__ = ('buckets', 'count', 'duration', 'queries', 'db_time', 'serializer_time', 'response_bytes')
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+
+    def observe(self, view, method, duration, stats, response_bytes):
+        with self._lock:
+            metrics = self._views.get((view, method))
+            if metrics is None:
+                metrics = self._views[(view, method)] = ViewMetrics()
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[i] += 1
+                    break
+            metrics.count += 1
+            metrics.duration += duration
+            metrics.queries += stats.queries
+            metrics.db_time += stats.db_time
+            metrics.serializer_time += stats.serializer_time
+            metrics.response_bytes += response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+    def render(self):
+        """Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            views = sorted(self._views.items())
+            snapshot = [(key, list(m.buckets), m.count, m.duration, m.queries,
+                         m.db_time, m.serializer_time, m.response_bytes) for key, m in views]
+
+        lines = [
+            '# HELP tastybites_request_duration_seconds Request wall time per view.',
+            '# TYPE tastybites_request_duration_seconds histogram',
+        ]
+        for (view, method), buckets, count, duration, *_ in snapshot:
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, hits in zip(BUCKETS, buckets):
+                cumulative += hits
+                lines.append(f'tastybites_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'tastybites_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'tastybites_request_duration_seconds_sum{{{labels}}} {duration:.6f}')
+            lines.append(f'tastybites_request_duration_seconds_count{{{labels}}} {count}')
+
+        counters = (
+            ('db_queries_total', 'Database queries per view.', 4, '{}'),
+            ('db_seconds_total', 'Time spent in the database per view.', 5, '{:.6f}'),
+            ('serializer_seconds_total', 'Time spent serializing per view.', 6, '{:.6f}'),
+            ('response_bytes_total', 'Response body bytes per view.', 7, '{}'),
+        )
+        for name, help_text, index, fmt in counters:
+            lines.append(f'# HELP tastybites_{name} {help_text}')
+            lines.append(f'# TYPE tastybites_{name} counter')
+            for row in snapshot:
+                view, method = row[0]
+                lines.append(f'tastybites_{name}{{view="{view}",method="{method}"}} {fmt.format(row[index])}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
@@ -0,0 +1,116 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+
+from .metrics import RequestStats, current_stats, record_query, registry, view_name
+from .query_inspector import QueryInspector, should_inspect
+
+
+def install_query_recorder(connection, **kwargs):
+    # First in the list so wrappers pushed later by execute_wrapper() (query
+    # budgets) can still pop themselves off the end.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_recorder)
+for existing in connections.all(initialized_only=True):
+    install_query_recorder(existing)
+
+
+class PerformanceMiddleware:
+    """
+    Times every request per resolved URL name, adds a ``Server-Timing``
+    header and feeds the histograms served by ``MetricsView``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        install_query_recorder(connection)
+        stats = RequestStats(QueryInspector(request) if should_inspect() else None)
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = RequestStats(QueryInspector(request) if should_inspect() else None)
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.finish(request, response, stats, start)
+
+    def finish(self, request, response, stats, start):
+        duration = time.perf_counter() - start
+        if response.streaming:
+            # The body (and its queries) is produced after this returns, the
+            # metrics are recorded once it is exhausted or the response closed
+            measure = self.ameasure_stream if response.is_async else self.measure_stream
+            response.streaming_content = measure(request, response.streaming_content, stats, start)
+        else:
+            self.record(request, stats, duration, len(response.content))
+
+        # For a stream, the time until its headers were ready
+        response['Server-Timing'] = (
+            f'total;dur={duration * 1000:.1f}, '
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+            f'serializer;dur={stats.serializer_time * 1000:.1f}'
+        )
+        return response
+
+    def record(self, request, stats, duration, size, streamed=False):
+        registry.observe(view_name(request), request.method, duration, stats, size)
+        if stats.inspector is not None:
+            # Raising at the end of a stream would only truncate a response
+            # whose status has already been sent
+            stats.inspector.report(enforce=not streamed)
+
+    def measure_stream(self, request, content, stats, start):
+        size = 0
+        try:
+            content = iter(content)
+            while True:
+                token = current_stats.set(stats)
+                try:
+                    chunk = next(content, None)
+                finally:
+                    current_stats.reset(token)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, stats, time.perf_counter() - start, size, streamed=True)
+
+    async def ameasure_stream(self, request, content, stats, start):
+        size = 0
+        try:
+            content = aiter(content)
+            while True:
+                token = current_stats.set(stats)
+                try:
+                    chunk = await anext(content, None)
+                finally:
+                    current_stats.reset(token)
+                if chunk is None:
+                    break
+                size += len(chunk)
+                yield chunk
+        finally:
+            self.record(request, stats, time.perf_counter() - start, size, streamed=True)
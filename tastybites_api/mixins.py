@@ -0,0 +1,158 @@
+import hashlib
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from orders.models import VersionConflict
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETag / Last-Modified validators and 304 handling to GET.
+
+    Views override ``get_etag`` and ``get_last_modified``; both run before
+    the handler so a revalidation never touches the serializer.
+    """
+
+    def get_etag(self, request, *args, **kwargs):
+        return None
+
+    def get_last_modified(self, request, *args, **kwargs):
+        return None
+
+    def format_etag(self, value):
+        return quote_etag(hashlib.md5(str(value).encode()).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_etag(request, *args, **kwargs)
+        if etag is not None:
+            etag = self.format_etag(etag)
+        last_modified = self.get_last_modified(request, *args, **kwargs)
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().get(request, *args, **kwargs)
+        if etag and not response.has_header('ETag'):
+            response['ETag'] = etag
+        if timestamp and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(timestamp)
+        return response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = 'The resource has changed since it was fetched.'
+    default_code = 'precondition_failed'
+
+
+class EditConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'The resource changed while it was being saved, try again.'
+    default_code = 'conflict'
+
+
+def version_etag(version, *variant):
+    """``"<version>.<digest>"``: the row version, then whatever else shapes the representation"""
+    digest = hashlib.md5(':'.join(map(str, variant)).encode()).hexdigest()[:16]
+    return quote_etag(f'{version}.{digest}')
+
+
+def if_match_versions(header):
+    """The versions named by the strong ETags of an If-Match header, None for ``*``"""
+    if header.strip() == '*':
+        return None
+    versions = set()
+    for tag in parse_etags(header):
+        version = tag.strip('"').partition('.')[0]
+        if not tag.startswith('W/') and version.isdigit():  # If-Match compares strongly
+            versions.add(int(version))
+    return versions
+
+
+class VersionedWriteMixin(ConditionalGetMixin):
+    """
+    Optimistic concurrency for a detail view of a model with a ``version``
+    column (orders.models.Versioned).
+
+    The ETag is the object's version (see version_etag). A PUT, PATCH or
+    DELETE with If-Match is answered 412 unless it names the current
+    version. Writes go through serializer.save() and Model.save(), with
+    their signals, and Versioned.save() makes the UPDATE conditional on the
+    version read, so an edit committed in between fails it too (412, or
+    409 without If-Match) without locking the row first.
+    """
+
+    def get_object(self):
+        # GET reads it for the ETag before the handler does
+        if not hasattr(self, '_object'):
+            self._object = super().get_object()
+        return self._object
+
+    def get_etag_variant(self, request, obj):
+        """What else changes the representation of ``obj``"""
+        return (request.accepted_renderer.format,)
+
+    def get_etag(self, request, *args, **kwargs):
+        obj = self.get_object()
+        return obj.version, self.get_etag_variant(request, obj)
+
+    def format_etag(self, value):
+        version, variant = value
+        return version_etag(version, *variant)
+
+    def get_object_etag(self, request, obj):
+        return self.format_etag((obj.version, self.get_etag_variant(request, obj)))
+
+    def check_version(self, obj):
+        header = self.request.headers.get('If-Match')
+        if header is not None:
+            versions = if_match_versions(header)
+            if versions is not None and obj.version not in versions:
+                raise PreconditionFailed()
+
+    @contextmanager
+    def version_conflicts(self):
+        """Answers a VersionConflict from the save() in the block with 412 (If-Match sent) or 409"""
+        try:
+            yield
+        except VersionConflict:
+            raise PreconditionFailed() if 'If-Match' in self.request.headers else EditConflict()
+
+    def perform_update(self, serializer):
+        self.check_version(serializer.instance)
+        # serializer.save() -> Versioned.save(): the UPDATE only matches the
+        # version checked here, so an edit committed since fails it too. The
+        # savepoint lets an enclosing transaction carry on after that
+        with transaction.atomic(), self.version_conflicts():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        self.check_version(instance)
+        with transaction.atomic(), self.version_conflicts():
+            instance.save(update_fields=['version'])
+            instance.delete()
+
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = self.get_object_etag(request, self.get_object())
+        return response
+
+
+class SparseFieldsMixin:
+    """
+    Serializer mixin taking a ``fields`` keyword that limits the output to
+    the named fields (a sparse fieldset). The serializer ignores names it
+    does not have; views validate ``?fields=`` first and answer 400 for
+    unknown ones (see ``MenuItemListView.get_requested_fields``).
+    """
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -0,0 +1,126 @@
+"""
+Query budgets: views and serializers declare the most queries they may run.
+
+Test runs (``settings.QUERY_BUDGET_ENFORCE``) fail on an overrun, debug
+runs (``QUERY_BUDGET_LOG``) log it, production requests pay nothing. The
+count is only known once the block has run, so an overrun is raised only
+while an enclosing transaction (the test case's) can still roll the work
+back; a request that already committed is answered normally and logged.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from rest_framework import serializers
+
+from .metrics import measure_serialization
+
+logger = logging.getLogger('tastybites_api.queries')
+
+
+# Transaction control differs between tests and production, don't count it
+TRANSACTION_SQL = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+_unbudgeted = ContextVar('unbudgeted', default=False)
+
+
+@contextmanager
+def unbudgeted():
+    """Queries in this block are not counted: lookups cached across requests, not run per request"""
+    token = _unbudgeted.set(True)
+    try:
+        yield
+    finally:
+        _unbudgeted.reset(token)
+
+
+def enforcing():
+    return getattr(settings, 'QUERY_BUDGET_ENFORCE', False)
+
+
+def checking():
+    return enforcing() or getattr(settings, 'QUERY_BUDGET_LOG', False)
+
+
+@contextmanager
+def query_budget(limit, label=''):
+    """Raises QueryBudgetExceeded (or logs) if the block runs more than ``limit`` queries"""
+    if limit is None or not checking():
+        yield
+        return
+
+    executed = []
+
+    def count(execute, sql, params, many, context):
+        if not sql.startswith(TRANSACTION_SQL) and not _unbudgeted.get():
+            executed.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        yield
+
+    if len(executed) > limit:
+        listing = '\n'.join(f'  {i}. {sql[:200]}' for i, sql in enumerate(executed, 1))
+        message = f'{label} ran {len(executed)} queries, budget is {limit}:\n{listing}'
+        if enforcing() and connection.in_atomic_block:
+            raise QueryBudgetExceeded(message)
+        logger.error(message)
+
+
+class QueryBudgetMixin:
+    """
+    View mixin enforcing ``query_budget`` for the whole request.
+
+    ``query_budget`` is either an int applying to every method or a dict
+    keyed by HTTP method; methods without an entry are unchecked.
+    """
+    query_budget = None
+
+    def get_query_budget(self, request):
+        budget = self.query_budget
+        if isinstance(budget, dict):
+            method = 'GET' if request.method == 'HEAD' else request.method
+            return budget.get(method)
+        return budget
+
+    def dispatch(self, request, *args, **kwargs):
+        label = f'{type(self).__name__} {request.method}'
+        with query_budget(self.get_query_budget(request), label):
+            return super().dispatch(request, *args, **kwargs)
+
+
+class QueryBudgetListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        label = f'{type(self.child).__name__}(many=True)'
+        with measure_serialization(), query_budget(getattr(self.child, 'query_budget', None), label):
+            return super().data
+
+
+class QueryBudgetSerializerMixin:
+    """
+    Serializer mixin enforcing ``query_budget`` while ``.data`` is built.
+
+    The same budget applies to ``many=True``, since a list should cost a
+    fixed number of queries however many objects it holds. The time spent
+    is also reported to the request metrics.
+    """
+    query_budget = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        meta = getattr(cls, 'Meta', None)
+        if meta is not None and not hasattr(meta, 'list_serializer_class'):
+            meta.list_serializer_class = QueryBudgetListSerializer
+
+    @property
+    def data(self):
+        with measure_serialization(), query_budget(self.query_budget, type(self).__name__):
+            return super().data
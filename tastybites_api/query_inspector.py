@@ -0,0 +1,77 @@
+"""
+Slow and duplicate query detection for sampled requests.
+
+``PerformanceMiddleware`` attaches a ``QueryInspector`` to a sampled
+request's stats; ``metrics.record_query`` feeds it every statement. Slow
+queries are logged as they happen; SQL repeated within one request (the
+N+1 signature) is logged once the response is ready, and fails test runs
+(``settings.DUPLICATE_QUERY_ENFORCE``) while the test case's transaction
+can still roll the request back. A streamed body's duplicates are only
+logged: its headers have been sent by the time they are known.
+"""
+import logging
+import random
+import traceback
+
+from django.conf import settings
+from django.db import connection
+
+from .metrics import view_name
+
+logger = logging.getLogger('tastybites_api.queries')
+
+
+class DuplicateQueries(AssertionError):
+    pass
+
+
+def should_inspect():
+    rate = getattr(settings, 'QUERY_INSPECTION_SAMPLE_RATE', 0.0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+
+def trimmed_stack():
+    """The innermost project frames, skipping Django, DRF and this module"""
+    base_dir = str(settings.BASE_DIR)
+    frames = [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir) and 'site-packages' not in frame.filename
+        and not frame.filename.endswith(('metrics.py', 'query_inspector.py'))
+    ]
+    depth = getattr(settings, 'QUERY_INSPECTION_STACK_DEPTH', 6)
+    return ''.join(traceback.format_list(frames[-depth:]))
+
+
+class QueryInspector:
+    __slots__ = ('request', 'counts', 'stacks')
+
+    def __init__(self, request):
+        self.request = request
+        self.counts = {}
+        self.stacks = {}
+
+    def record(self, sql, duration):
+        count = self.counts[sql] = self.counts.get(sql, 0) + 1
+        if count == 2:
+            self.stacks[sql] = trimmed_stack()
+        if duration * 1000 >= getattr(settings, 'SLOW_QUERY_MS', 100):
+            logger.warning(
+                'Slow query (%.1f ms) in %s: %s\n%s',
+                duration * 1000, view_name(self.request), sql[:500], trimmed_stack()
+            )
+
+    def duplicates(self):
+        threshold = getattr(settings, 'DUPLICATE_QUERY_THRESHOLD', 5)
+        return {sql: count for sql, count in self.counts.items() if count >= threshold}
+
+    def report(self, enforce=True):
+        duplicates = self.duplicates()
+        for sql, count in duplicates.items():
+            logger.warning(
+                'Query repeated %d times in %s: %s\n%s',
+                count, view_name(self.request), sql[:500], self.stacks.get(sql, '')
+            )
+        if (duplicates and enforce and getattr(settings, 'DUPLICATE_QUERY_ENFORCE', False)
+                and connection.in_atomic_block):
+            listing = '\n'.join(f'  {count}x {sql[:200]}' for sql, count in duplicates.items())
+            raise DuplicateQueries(f'{view_name(self.request)} repeated queries:\n{listing}')
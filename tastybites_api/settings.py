@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -46,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'tastybites_api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,10 +67,86 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.StatelessJWTAuthentication',
+    ),
+    # orjson renderer/parser; the browsable API is only offered in DEBUG
+    'DEFAULT_RENDERER_CLASSES': (
+        'tastybites_api.renderers.FastJSONRenderer',
+    ) + (('rest_framework.renderers.BrowsableAPIRenderer',) if DEBUG else ()),
+    'DEFAULT_PARSER_CLASSES': (
+        'tastybites_api.renderers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ),
 }
 
+# Menu snapshots and the menu version that invalidates them live in the
+# cache. LocMemCache is private to each process: without DJANGO_REDIS_URL run
+# a single worker process (threads are fine), or a menu change only reaches
+# the process that made it. Set it (needs the redis package) to share the
+# cache between several workers.
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tastybites',
+        }
+    }
+
+MENU_CACHE_TIMEOUT = 60 * 60  # seconds
+
+# In-process cache of full user rows for views that need more than the
+# token claims (seconds / entries)
+USER_CACHE_TTL = 60
+USER_CACHE_SIZE = 1024
+
+# How long a replayed Idempotency-Key returns the original order (seconds);
+# expired keys are swept after this share of the orders placed with a key
+# (orders.idempotency) or all at once by the purge_idempotency_keys command
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_SWEEP_RATE = 0.01
+
+# Pending orders older than this are canceled by the expire_pending_orders
+# command (minutes)
+PENDING_ORDER_EXPIRY = 2 * 60
+
+# Serve order reads from values() rows instead of OrderSerializer
+ORDERS_FAST_READ = True
+
+# Check the query_budget declared on views and serializers: test runs fail
+# on an overrun (tastybites_api.test_settings), debug runs log it
+QUERY_BUDGET_ENFORCE = False
+QUERY_BUDGET_LOG = DEBUG
+
+# Slow / duplicate query detection (tastybites_api.query_inspector). A
+# sampled request logs queries over SLOW_QUERY_MS and SQL run at least
+# DUPLICATE_QUERY_THRESHOLD times; debug runs inspect everything, test runs
+# also fail on the duplicates (tastybites_api.test_settings).
+QUERY_INSPECTION_SAMPLE_RATE = 1.0 if DEBUG else 0.01
+SLOW_QUERY_MS = 100
+DUPLICATE_QUERY_THRESHOLD = 5
+DUPLICATE_QUERY_ENFORCE = False
+QUERY_INSPECTION_STACK_DEPTH = 6
+
+# Kitchen board event stream (orders.events): events kept for replay from
+# Last-Event-ID, undelivered events a client may lag behind before it is
+# disconnected, seconds between keepalive comments, client reconnect delay
+ORDER_EVENTS_REPLAY = 1000
+ORDER_EVENTS_CLIENT_BUFFER = 100
+ORDER_EVENTS_KEEPALIVE = 15
+ORDER_EVENTS_RETRY_MS = 3000
+
+# Admin changelists count exactly up to this many rows, then estimate
+# (tastybites_api.admin.EstimatedCountPaginator)
+ADMIN_COUNT_ESTIMATE_THRESHOLD = 10000
+
 ROOT_URLCONF = 'tastybites_api.urls'
 
 TEMPLATES = [
@@ -92,10 +170,37 @@ WSGI_APPLICATION = 'tastybites_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# SQLite tuned for concurrent requests. WAL lets readers run beside the one
+# writer; synchronous=NORMAL syncs at checkpoints instead of every commit
+# (still crash safe in WAL mode); mmap_size and cache_size (KiB when
+# negative) keep hot pages in memory. Transactions BEGIN IMMEDIATE, so a
+# writer queues for the lock up front (for up to 'timeout' seconds) instead
+# of failing with "database is locked" when its read turns into a write.
+# That holds for every atomic() block, read-only ones take the write lock
+# too: keep reads outside atomic().
+# Persistent connections skip reconnecting and re-running the pragmas, but
+# only under WSGI: wsgi.py sets DJANGO_CONN_MAX_AGE. Under ASGI connections
+# belong to async contexts and would pile up or go stale, so the default
+# closes them after every request.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -32 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DJANGO_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,  # busy_timeout, seconds
+        },
     }
 }
 
@@ -140,6 +245,9 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Widths (px) of the JPEG/WebP variants generated for menu item images
+MENU_IMAGE_WIDTHS = (320, 640, 1024)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
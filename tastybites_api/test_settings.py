@@ -0,0 +1,9 @@
+"""
+Settings for ``manage.py test`` (selected by manage.py): query budget
+overruns and duplicate queries fail the tests instead of being logged.
+"""
+from .settings import *  # noqa: F401,F403
+
+QUERY_BUDGET_ENFORCE = True
+DUPLICATE_QUERY_ENFORCE = True
+QUERY_INSPECTION_SAMPLE_RATE = 1.0
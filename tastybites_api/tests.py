@@ -0,0 +1,56 @@
+from io import BytesIO
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from rest_framework.renderers import JSONRenderer
+
+from accounts.models import CustomUser
+from .middleware import PerformanceMiddleware
+from .query_inspector import DuplicateQueries
+from .renderers import FastJSONParser, FastJSONRenderer
+
+
+class FastJSONTests(SimpleTestCase):
+    def test_matches_drf(self):
+        data = {'id': 1, 'total': '19.00', 'name': 'Crème brûlée\u2028', 'tags': [None, True], 2: 'key'}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_floats_use_the_shortest_form(self):
+        self.assertEqual(FastJSONRenderer().render([0.1, 1e16, 1e-7]), b'[0.1,1e16,1e-7]')
+        self.assertEqual(JSONRenderer().render([0.1, 1e16, 1e-7]), b'[0.1,1e+16,1e-07]')
+
+    def test_non_finite_floats_become_null(self):
+        self.assertEqual(FastJSONRenderer().render([float('nan'), float('inf')]), b'[null,null]')
+        with self.assertRaises(ValueError):
+            JSONRenderer().render([float('nan')])
+
+    def test_parser_honours_the_request_charset(self):
+        body = '{"name": "Crème brûlée"}'
+        for encoding in ('utf-8', 'latin-1'):
+            with self.subTest(encoding=encoding):
+                data = FastJSONParser().parse(BytesIO(body.encode(encoding)), parser_context={'encoding': encoding})
+                self.assertEqual(data, {'name': 'Crème brûlée'})
+
+
+class DuplicateQueryTests(TestCase):
+    def repeat_query(self):
+        for _ in range(5):
+            CustomUser.objects.filter(pk=1).exists()
+
+    def test_buffered_response_fails(self):
+        def view(request):
+            self.repeat_query()
+            return HttpResponse('ok')
+
+        with self.assertRaises(DuplicateQueries):
+            PerformanceMiddleware(view)(RequestFactory().get('/'))
+
+    def test_streamed_response_only_logs(self):
+        def body():
+            self.repeat_query()
+            yield b'ok'
+
+        response = PerformanceMiddleware(lambda request: StreamingHttpResponse(body()))(RequestFactory().get('/'))
+        with self.assertLogs('tastybites_api.queries', 'WARNING') as logs:
+            self.assertEqual(b''.join(response.streaming_content), b'ok')
+        self.assertIn('Query repeated 5 times', logs.output[0])
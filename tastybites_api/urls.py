@@ -22,6 +22,7 @@ from django.conf.urls.static import static
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions 
+from .views import MetricsView
 schema_view = get_schema_view(
     openapi.Info(
         title="TastyBites API",
@@ -35,6 +36,7 @@ urlpatterns = [
     path('api/auth/', include('accounts.urls')),
     path('api/menu/', include('menu.urls')),
     path('api/orders/', include('orders.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
       path('swagger/', schema_view.with_ui('swagger', cache_timeout=0)),#swager
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0)),
 ]
@@ -0,0 +1,13 @@
+from django.http import HttpResponse
+from rest_framework import permissions
+from rest_framework.views import APIView
+
+from .metrics import registry
+
+
+class MetricsView(APIView):
+    """Per-view request metrics in the Prometheus text format (staff only)"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tastybites_api.settings')
+# Persistent database connections, safe with WSGI's thread per request
+os.environ.setdefault('DJANGO_CONN_MAX_AGE', '600')
 
 application = get_wsgi_application()